@@ -5,8 +5,9 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from config import config
+from app.db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -19,6 +20,12 @@ def create_app(config_name='default'):
     
     # Initialize extensions
     db.init_app(app)
+    from app import engine
+    engine.init_app(app)
+    from app import perf
+    perf.init_app(app)
+    from app import metrics
+    metrics.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     bcrypt.init_app(app)
@@ -39,11 +46,40 @@ def create_app(config_name='default'):
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
     
-    # Import models and setup user loader
-    from app.models import User
+    # Import models and setup the (cached) user loader
+    from app import user_cache
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    from app import search
+    search.init_app(app)
+    
+    from app import book_import
+    book_import.init_app(app)
+    
+    from app import storage
+    storage.init_app(app)
+    
+    from app import exports
+    exports.init_app(app)
+    
+    from app import ledger
+    ledger.init_app(app)
+    
+    from app import analytics
+    analytics.init_app(app)
+    
+    from app import stats
+    stats.init_app(app)
+    
+    from app import jobs
+    jobs.init_app(app)
+    
+    from app import rentals
+    rentals.init_app(app)
+    
+    from app import sessions
+    sessions.init_app(app)
+    
+    from app import db_routing
+    db_routing.init_app(app)
     
     return app
\ No newline at end of file
@@ -1,10 +1,15 @@
 # app/admin/routes.py
-from flask import render_template, url_for, flash, redirect, request
+from flask import render_template, url_for, flash, redirect, request, current_app, stream_with_context, jsonify
+from datetime import datetime
 from flask_login import login_required, current_user
 from app.models import User, Book, Transaction, Wallet
 from app.admin.forms import UserSearchForm, BookSearchForm, SystemSettingsForm, AnnouncementForm
-from app import db
+from app import analytics, db, db_routing, exports, jobs, page_cache, perf, user_cache
 from app.admin import bp
+from app.search import search_books
+from app.pagination import keyset_paginate
+from app.stats import dashboard_stats, get_counters
+from app import queries
 
 @bp.route('/dashboard')
 @login_required
@@ -13,19 +18,18 @@ def dashboard():
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Statistics for dashboard
-    total_users = User.query.count()
-    total_books = Book.query.count()
-    total_transactions = Transaction.query.count()
-    recent_transactions = Transaction.query.order_by(Transaction.created_at.desc()).limit(5).all()
+    # Statistics for dashboard come from precomputed counters (see app/stats.py)
+    recent_transactions = queries.recent_transactions(current_app.config.get('ADMIN_DASHBOARD_RECENT_TRANSACTIONS', 5),
+                                                      profile='transaction_feed')
     
     # FIX: Use the admin-specific dashboard template
     return render_template('admin/dashboard.html',  # Add 'admin/' prefix
                          title='Admin Dashboard',
-                         total_users=total_users,
-                         total_books=total_books,
-                         total_transactions=total_transactions,
-                         recent_transactions=recent_transactions)
+                         recent_transactions=recent_transactions,
+                         current_time=datetime.utcnow(),
+                         user_cache_stats=user_cache.stats(),
+                         page_cache_stats=page_cache.stats(),
+                         **dashboard_stats())
 
 @bp.route('/users', methods=['GET', 'POST'])
 @login_required
@@ -35,7 +39,7 @@ def users():
         return redirect(url_for('main.index'))
     
     form = UserSearchForm()
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     
     # Build query based on form filters
     query = User.query
@@ -57,12 +61,15 @@ def users():
             is_active = status == 'active'
             query = query.filter(User.is_active == is_active)
     
-    users = query.order_by(User.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+    users = keyset_paginate(query, (User.created_at, User.user_id), cursor, per_page=20)
+    book_counts = queries.book_counts([user.user_id for user in users.items])
     
     # FIX: Use admin-specific users template
-    return render_template('admin/users.html', title='Manage Users', users=users, form=form)
+    return render_template('admin/users.html', title='Manage Users', users=users, form=form,
+                           book_counts=book_counts)
 
 @bp.route('/toggle_user/<int:user_id>')
+@db_routing.use_primary
 @login_required
 def toggle_user(user_id):
     if not current_user.is_admin():
@@ -71,6 +78,7 @@ def toggle_user(user_id):
     
     user = User.query.get_or_404(user_id)
     user.is_active = not user.is_active
+    user_cache.invalidate(user.user_id)
     db.session.commit()
     
     status = "activated" if user.is_active else "deactivated"
@@ -78,6 +86,7 @@ def toggle_user(user_id):
     return redirect(url_for('admin.users'))
 
 @bp.route('/make_admin/<int:user_id>')
+@db_routing.use_primary
 @login_required
 def make_admin(user_id):
     if not current_user.is_admin():
@@ -86,6 +95,7 @@ def make_admin(user_id):
     
     user = User.query.get_or_404(user_id)
     user.role = 'admin'
+    user_cache.invalidate(user.user_id)
     db.session.commit()
     
     flash(f'User {user.username} is now an administrator.', 'success')
@@ -99,10 +109,10 @@ def books():
         return redirect(url_for('main.index'))
     
     form = BookSearchForm()
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     
     # Build query based on form filters
-    query = Book.query
+    query = queries.books('book_list')
     
     if form.validate_on_submit() or request.args.get('title'):
         # Handle both form submission and pagination with filters
@@ -112,20 +122,21 @@ def books():
         status = form.status.data or request.args.get('status', '')
         
         if title:
-            query = query.filter(Book.title.contains(title))
+            query = search_books(query, title, columns=['title'], ranked=False)
         if author:
-            query = query.filter(Book.author.contains(author))
+            query = search_books(query, author, columns=['author'], ranked=False)
         if category:
             query = query.filter(Book.category == category)
         if status:
             query = query.filter(Book.status == status)
     
-    books = query.order_by(Book.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+    books = keyset_paginate(query, (Book.created_at, Book.book_id), cursor, per_page=20)
     
     # FIX: Use admin-specific books template
     return render_template('admin/books.html', title='Manage Books', books=books, form=form)
 
 @bp.route('/delete_book/<int:book_id>')
+@db_routing.use_primary
 @login_required
 def delete_book(book_id):
     if not current_user.is_admin():
@@ -133,6 +144,8 @@ def delete_book(book_id):
         return redirect(url_for('main.index'))
     
     book = Book.query.get_or_404(book_id)
+    if book.file_path:
+        jobs.enqueue('storage.release', file_path=book.file_path)
     db.session.delete(book)
     db.session.commit()
     
@@ -147,20 +160,105 @@ def transactions():
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('main.index'))
     
-    page = request.args.get('page', 1, type=int)
-    transactions = Transaction.query.order_by(Transaction.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+    cursor = request.args.get('cursor')
+    transactions = keyset_paginate(queries.transactions('transaction_list'),
+                                   (Transaction.created_at, Transaction.transaction_id),
+                                   cursor, per_page=current_app.config.get('ADMIN_TRANSACTIONS_PER_PAGE', 20))
     
-    # Calculate total volume
-    total_volume = db.session.query(db.func.sum(Transaction.amount)).scalar() or 0.0
+    counters = get_counters('transactions.volume', 'transactions.purchase',
+                            'transactions.rental', 'transactions.completed')
     
     return render_template('admin/transactions.html', 
                          title='Transaction History', 
                          transactions=transactions,
-                         total_volume=total_volume)  # Add this variable
+                         total_volume=counters['transactions.volume'],
+                         purchase_count=int(counters['transactions.purchase']),
+                         rental_count=int(counters['transactions.rental']),
+                         completed_count=int(counters['transactions.completed']))
 
-# app/admin/routes.py - Update settings function
-from datetime import datetime
+@bp.route('/transactions/export')
+@db_routing.use_replica
+@login_required
+def export_transactions():
+    if not current_user.is_admin():
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    fmt = request.args.get('format', 'csv')
+    types = [value for value in request.args.getlist('type') if value]
+    try:
+        start = exports.parse_day(request.args.get('start'), 'Start date')
+        end = exports.parse_day(request.args.get('end'), 'End date')
+    except ValueError as error:
+        flash(str(error), 'warning')
+        return redirect(url_for('admin.transactions'))
+    if fmt not in exports.FORMATS or any(value not in exports.TYPES for value in types):
+        flash('Unknown export format or transaction type.', 'warning')
+        return redirect(url_for('admin.transactions'))
+    
+    # Streamed in chunks while the query is still reading; the app context stays open until the end
+    rows = stream_with_context(exports.stream(exports.journal_query(start, end, types), fmt))
+    response = current_app.response_class(rows, mimetype=exports.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={exports.filename(fmt, start, end)}'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass chunks on as they come
+    return response
+
+@bp.route('/perf')
+@login_required
+def perf_report():
+    if not current_user.is_admin():
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    endpoints, sample_count = perf.summary()
+    slow_queries = [(datetime.utcfromtimestamp(when), ms, statement, params)
+                    for when, ms, statement, params in perf.slow_queries()]
+    
+    return render_template('admin/perf.html',
+                         title='Performance',
+                         endpoints=endpoints,
+                         sample_count=sample_count,
+                         buffer_size=current_app.config.get('PERF_BUFFER_SIZE', 5000),
+                         slow_queries=slow_queries,
+                         slow_threshold=current_app.config.get('PERF_SLOW_QUERY_MS'))
+
+@bp.route('/analytics')
+@db_routing.use_replica
+@login_required
+def analytics_report():
+    if not current_user.is_admin():
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    try:
+        start, end, bucket = analytics.parse_range(request.args.get('start'), request.args.get('end'),
+                                                   request.args.get('bucket', 'day'))
+    except ValueError as error:
+        flash(str(error), 'warning')
+        return redirect(url_for('admin.analytics_report'))
+    
+    report = analytics.report(start, end, bucket)
+    return render_template('admin/analytics.html',
+                         title='Analytics',
+                         report=report,
+                         buckets=analytics.BUCKETS,
+                         peak=max((period['revenue'] for period in report['series']), default=0))
 
+@bp.route('/analytics/data')
+@db_routing.use_replica
+@login_required
+def analytics_data():
+    if not current_user.is_admin():
+        return jsonify(error='Admin privileges required.'), 403
+    
+    try:
+        start, end, bucket = analytics.parse_range(request.args.get('start'), request.args.get('end'),
+                                                   request.args.get('bucket', 'day'))
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    return jsonify(analytics.report(start, end, bucket))
+
+# app/admin/routes.py - Update settings function
 @bp.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
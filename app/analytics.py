@@ -0,0 +1,263 @@
+# app/analytics.py
+"""Revenue rollups behind ``/admin/analytics``.
+
+Two small tables summarise the transactions table: ``revenue_rollups`` per
+UTC day, book category and transaction type, and ``book_revenue_rollups``
+per day and book.  They are kept current the way app/stats.py keeps its
+counters: an ``after_flush`` hook upserts the deltas of ORM-added (or
+deleted) transactions in the same database transaction, and bulk INSERTs
+call ``record(rows)``, so a rollup commits or rolls back together with
+the rows it counts.
+
+A transaction is filed under the category its book had when it was
+recorded.  ``flask analytics backfill`` rebuilds a date range (or all of
+history) from the transactions table with the books' current categories.
+
+``report()`` reads nothing but the rollups: a year is a few thousand
+category rows however many transactions there are.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import click
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from flask.cli import AppGroup
+from app import db, exports
+from app.models import Book, Transaction, RevenueRollup, BookRevenueRollup
+
+TYPES = ('purchase', 'rental')
+BUCKETS = ('day', 'week', 'month')
+DEFAULT_DAYS = 30
+MAX_PERIODS = 400  # points in one series; longer ranges need a wider bucket
+TOP = 10
+
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def _deltas(connection, changes):
+    """Rollup deltas for (transaction, sign) pairs, keyed like each table's primary key."""
+    book_ids = {transaction.book_id for transaction, _ in changes}
+    categories = dict(connection.execute(
+        sa.select(Book.book_id, Book.category).where(Book.book_id.in_(book_ids))).all())
+    revenue, books = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+    for transaction, sign in changes:
+        day = _day(transaction.created_at)
+        cents = round((transaction.amount or 0) * 100) * sign
+        for delta in (revenue[day, categories.get(transaction.book_id) or '', transaction.transaction_type],
+                      books[day, transaction.book_id]):
+            delta[0] += sign
+            delta[1] += cents
+    return revenue, books
+
+
+def _upsert(connection, table, keys, deltas):
+    """Add (count, cents) deltas to their rollup rows with one upsert per row."""
+    upsert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(connection.dialect.name)
+    for key, (count, cents) in deltas.items():
+        if not count and not cents:
+            continue
+        match = dict(zip(keys, key))
+        if upsert is not None:
+            statement = upsert(table).values(**match, transaction_count=count, amount_cents=cents)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c[name] for name in keys],
+                set_={'transaction_count': table.c.transaction_count + statement.excluded.transaction_count,
+                      'amount_cents': table.c.amount_cents + statement.excluded.amount_cents},
+            )
+            connection.execute(statement)
+            continue
+        result = connection.execute(
+            table.update().where(*(table.c[name] == value for name, value in match.items()))
+                 .values(transaction_count=table.c.transaction_count + count,
+                         amount_cents=table.c.amount_cents + cents)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**match, transaction_count=count, amount_cents=cents))
+
+
+def _apply(connection, changes):
+    if not changes:
+        return
+    revenue, books = _deltas(connection, changes)
+    _upsert(connection, RevenueRollup.__table__, ('day', 'category', 'transaction_type'), revenue)
+    _upsert(connection, BookRevenueRollup.__table__, ('day', 'book_id'), books)
+
+
+def record(rows):
+    """Roll up transactions written with a bulk INSERT (given as column dicts)."""
+    _apply(db.session.connection(), [(SimpleNamespace(**row), 1) for row in rows])
+
+
+def _track_flush(session, flush_context):
+    changes = [(obj, sign) for sign, objects in ((1, session.new), (-1, session.deleted))
+               for obj in objects if isinstance(obj, Transaction)]
+    if changes:
+        _apply(session.connection(), changes)
+
+
+def backfill(start=None, end=None, connection=None):
+    """Rebuild the rollups for days ``start``..``end`` (dates, inclusive; None = open) from history.
+
+    Returns the number of transactions rolled up.  Caller commits.
+    """
+    connection = connection or db.session.connection()
+    day = sa.func.date(Transaction.created_at)
+    cents = sa.func.sum(sa.cast(sa.func.round(Transaction.amount * 100), sa.BigInteger))
+    category = sa.func.coalesce(Book.category, '')
+    source = [Transaction.created_at.is_not(None)]
+    for table in (RevenueRollup.__table__, BookRevenueRollup.__table__):
+        delete = table.delete()
+        if start is not None:
+            delete = delete.where(table.c.day >= start)
+        if end is not None:
+            delete = delete.where(table.c.day <= end)
+        connection.execute(delete)
+    if start is not None:
+        source.append(Transaction.created_at >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        source.append(Transaction.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    connection.execute(RevenueRollup.__table__.insert().from_select(
+        ['day', 'category', 'transaction_type', 'transaction_count', 'amount_cents'],
+        sa.select(day, category, Transaction.transaction_type, sa.func.count(), cents)
+          .select_from(Transaction)
+          .outerjoin(Book, Book.book_id == Transaction.book_id)
+          .where(*source)
+          .group_by(day, category, Transaction.transaction_type)
+    ))
+    connection.execute(BookRevenueRollup.__table__.insert().from_select(
+        ['day', 'book_id', 'transaction_count', 'amount_cents'],
+        sa.select(day, Transaction.book_id, sa.func.count(), cents)
+          .where(*source)
+          .group_by(day, Transaction.book_id)
+    ))
+    return connection.execute(
+        sa.select(sa.func.count()).select_from(Transaction).where(*source)).scalar()
+
+
+def parse_range(start, end, bucket):
+    """(start date, end date, bucket) from request strings; the last DEFAULT_DAYS days by default.
+
+    Raises ValueError with a message fit for the user.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f'bucket must be one of {", ".join(BUCKETS)}')
+    end = exports.parse_day(end, 'End date')
+    end = end.date() if end else datetime.utcnow().date()
+    start = exports.parse_day(start, 'Start date')
+    start = start.date() if start else end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise ValueError('Start date must not be after the end date')
+    if (end - start).days >= MAX_PERIODS * {'day': 1, 'week': 7, 'month': 28}[bucket]:
+        raise ValueError(f'Too many {bucket}s in that range; pick a wider bucket')
+    return start, end, bucket
+
+
+def _period(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())  # Monday
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _periods(start, end, bucket):
+    periods, day = [], _period(start, bucket)
+    while day <= end:
+        periods.append(day)
+        day = (day.replace(day=28) + timedelta(days=4)).replace(day=1) if bucket == 'month' \
+            else day + timedelta(days=7 if bucket == 'week' else 1)
+    return periods
+
+
+def _money(cents):
+    return round(cents / 100, 2)
+
+
+def _split(count=0, cents=0):
+    return {'transactions': count, 'revenue_cents': cents}
+
+
+def _totals(parts):
+    """Flatten {type: split} into the JSON shape: overall totals plus a split per type."""
+    count = sum(part['transactions'] for part in parts.values())
+    cents = sum(part['revenue_cents'] for part in parts.values())
+    return {'transactions': count, 'revenue': _money(cents),
+            **{kind: {'transactions': part['transactions'], 'revenue': _money(part['revenue_cents']),
+                      'share': round(part['revenue_cents'] / cents * 100, 1) if cents else 0.0}
+               for kind, part in parts.items()}}
+
+
+def report(start, end, bucket='day', top=TOP):
+    """Revenue for days ``start``..``end`` (inclusive) from the rollups, as a JSON-ready dict."""
+    in_range = RevenueRollup.day.between(start, end)
+    count, cents = sa.func.sum(RevenueRollup.transaction_count), sa.func.sum(RevenueRollup.amount_cents)
+
+    series = {period: {kind: _split() for kind in TYPES} for period in _periods(start, end, bucket)}
+    overall = {kind: _split() for kind in TYPES}
+    for day, kind, n, total in db.session.execute(
+            sa.select(RevenueRollup.day, RevenueRollup.transaction_type, count, cents)
+              .where(in_range).group_by(RevenueRollup.day, RevenueRollup.transaction_type)):
+        for parts in (series[_period(day, bucket)], overall):
+            part = parts.setdefault(kind, _split())
+            part['transactions'] += n
+            part['revenue_cents'] += total
+
+    categories = defaultdict(lambda: {kind: _split() for kind in TYPES})
+    for category, kind, n, total in db.session.execute(
+            sa.select(RevenueRollup.category, RevenueRollup.transaction_type, count, cents)
+              .where(in_range).group_by(RevenueRollup.category, RevenueRollup.transaction_type)):
+        categories[category][kind] = _split(n, total)
+    ranked = sorted(categories.items(), key=lambda item: -sum(part['revenue_cents'] for part in item[1].values()))
+
+    book_count = sa.func.sum(BookRevenueRollup.transaction_count).label('transactions')
+    book_cents = sa.func.sum(BookRevenueRollup.amount_cents).label('revenue_cents')
+    best = sa.select(BookRevenueRollup.book_id, book_count, book_cents)\
+        .where(BookRevenueRollup.day.between(start, end))\
+        .group_by(BookRevenueRollup.book_id)\
+        .order_by(book_cents.desc(), BookRevenueRollup.book_id)\
+        .limit(top).subquery()
+    books = db.session.execute(
+        sa.select(best.c.book_id, Book.title, Book.author, Book.category,
+                  best.c.transactions, best.c.revenue_cents)
+          .outerjoin(Book, Book.book_id == best.c.book_id)
+          .order_by(best.c.revenue_cents.desc(), best.c.book_id)
+    ).all()
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'totals': _totals(overall),
+        'series': [{'period': period.isoformat(), **_totals(parts)} for period, parts in series.items()],
+        'categories': [{'category': category or None, **_totals(parts)} for category, parts in ranked[:top]],
+        'books': [{'book_id': row.book_id, 'title': row.title, 'author': row.author, 'category': row.category,
+                   'transactions': row.transactions, 'revenue': _money(row.revenue_cents)} for row in books],
+    }
+
+
+analytics_cli = AppGroup('analytics', help='Maintain the revenue rollups.')
+
+
+@analytics_cli.command('backfill')
+@click.option('--start', help='First day to rebuild (YYYY-MM-DD; default: all of history).')
+@click.option('--end', help='Last day to rebuild (YYYY-MM-DD; default: all of history).')
+def backfill_command(start, end):
+    """Rebuild the revenue rollups from the transactions table."""
+    try:
+        start, end = exports.parse_day(start, '--start'), exports.parse_day(end, '--end')
+    except ValueError as error:
+        raise click.BadParameter(str(error)) from None
+    count = backfill(start and start.date(), end and end.date())
+    db.session.commit()
+    click.echo(f'Rolled up {count} transactions.')
+
+
+def init_app(app):
+    app.cli.add_command(analytics_cli)
+
+
+sa.event.listen(db.session, 'after_flush', _track_flush)
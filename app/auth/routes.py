@@ -2,8 +2,8 @@
 from flask import render_template, url_for, flash, redirect, request
 from flask_login import login_user, current_user, logout_user, login_required
 from app.auth.forms import RegistrationForm, LoginForm
-from app.models import User, Wallet
-from app import db, bcrypt
+from app.models import User
+from app import db, bcrypt, jobs, ledger, user_cache
 from app.auth import bp
 
 @bp.route('/register', methods=['GET', 'POST'])
@@ -39,10 +39,9 @@ def register():
         db.session.add(user)
         db.session.flush()  # This assigns user_id without committing
         
-        # Create wallet for user with initial balance (only for students)
+        # Create wallet for user with initial balance (only for students); credit creates the wallet
         if form.role.data == 'student':
-            wallet = Wallet(user_id=user.user_id, balance=100.00)
-            db.session.add(wallet)
+            ledger.credit(user.user_id, 10000, 'bonus')
         
         db.session.commit()
         
@@ -59,7 +58,6 @@ def register():
 def login():
     if current_user.is_authenticated:
         # If already logged in, redirect based on role - FIXED
-        print(f"Already authenticated: {current_user.username}, Role: {current_user.role}, is_admin: {current_user.is_admin()}")
         if current_user.role == 'admin':  # Use direct role check for safety
             return redirect(url_for('admin.dashboard'))
         else:
@@ -87,13 +85,9 @@ def login():
             
             # Ensure wallet exists for students (backward compatibility)
             if user.role == 'student' and not user.wallet:
-                wallet = Wallet(user_id=user.user_id, balance=0.00)
-                db.session.add(wallet)
+                jobs.enqueue('wallets.ensure', user_id=user.user_id)
                 db.session.commit()
             
-            # DEBUG: Print user info for troubleshooting
-            print(f"LOGIN SUCCESS: User: {user.username}, Role: {user.role}, is_admin(): {user.is_admin()}")
-            
             # Role-based redirect after login - FIXED with direct role check
             if user.role == 'admin':
                 flash(f'Welcome back, Administrator {user.username}!', 'success')
@@ -109,6 +103,8 @@ def login():
 
 @bp.route('/logout')
 def logout():
+    if current_user.is_authenticated:
+        user_cache.invalidate(current_user.user_id)
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('main.index'))
\ No newline at end of file
@@ -0,0 +1,181 @@
+# app/book_import.py
+"""``flask books import``: bulk-load a reading list from a CSV or JSONL manifest.
+
+Each row has the BookForm fields (title, author, isbn, description, category,
+price, rental_fee) and optionally ``file``, a PDF path relative to
+``--files``.  Rows are checked with BookForm's own validators, files go
+through ``storage.save`` like a web upload, and every ``--batch-size`` rows
+are written with one multi-row INSERT and committed.  The manifest is read
+as a stream, so memory use is one batch whatever the file size.
+
+Invalid rows are reported with their line number and skipped (``--strict``
+stops at the first one instead; batches already committed stay).
+``--dry-run`` only validates.
+"""
+import csv
+import json
+import os
+import time
+from datetime import datetime
+import click
+import sqlalchemy as sa
+import wtforms
+from flask.cli import AppGroup
+from flask_wtf.file import FileAllowed
+from werkzeug.datastructures import FileStorage, MultiDict
+from app import db, page_cache, stats, storage
+from app.books.forms import BookForm
+from app.models import Book, User
+
+FIELDS = ('title', 'author', 'isbn', 'description', 'category', 'price', 'rental_fee')
+DEFAULT_BATCH = 1000
+
+# BookForm minus CSRF and the file field: a plain form is cheap to re-process for every row
+_RowForm = type('_RowForm', (wtforms.Form,), {name: getattr(BookForm, name) for name in FIELDS})
+_FILE_EXTENSIONS = next(validator.upload_set for validator in BookForm.book_file.kwargs['validators']
+                        if isinstance(validator, FileAllowed))
+
+
+class InvalidRow(Exception):
+    pass
+
+
+def read_manifest(handle, fmt):
+    """Yield (line number, row dict) from an open CSV or JSONL manifest."""
+    if fmt == 'csv':
+        reader = csv.DictReader(handle)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(handle, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, InvalidRow(f'not JSON: {error}')
+            continue
+        yield number, row if isinstance(row, dict) else InvalidRow('not a JSON object')
+
+
+def _resolve_file(name, files_dir):
+    if not files_dir:
+        raise InvalidRow('has a file but no --files directory was given')
+    path = os.path.realpath(os.path.join(files_dir, name))
+    if os.path.commonpath([path, files_dir]) != files_dir:
+        raise InvalidRow(f'file {name!r} is outside the --files directory')
+    if os.path.splitext(path)[1].lower().lstrip('.') not in _FILE_EXTENSIONS:
+        raise InvalidRow(f'file {name!r}: {", ".join(_FILE_EXTENSIONS).upper()} files only')
+    if not os.path.isfile(path):
+        raise InvalidRow(f'file {name!r} not found')
+    return path
+
+
+def validate(form, row, files_dir):
+    """Book column values (and the source file path or None) for one manifest row."""
+    if isinstance(row, InvalidRow):
+        raise row
+    form.process(MultiDict({name: '' if row.get(name) is None else str(row[name]) for name in FIELDS}))
+    if not form.validate():
+        raise InvalidRow('; '.join(f'{name}: {" ".join(errors)}' for name, errors in form.errors.items()))
+    values = {name: form[name].data for name in FIELDS}
+    values['isbn'] = values['isbn'] or None
+    values['price'] = values['price'] or 0.0
+    values['rental_fee'] = values['rental_fee'] or 0.0
+    source = str(row.get('file') or '').strip()
+    return values, _resolve_file(source, files_dir) if source else None
+
+
+def _store(path):
+    with open(path, 'rb') as handle:
+        return storage.save(FileStorage(handle, filename=os.path.basename(path)))
+
+
+def write_batch(rows, sources, uploader_id):
+    """Store the batch's files, then insert and commit its rows in one transaction."""
+    now = datetime.utcnow()
+    stored = []
+    try:
+        for values, source in zip(rows, sources):
+            values['file_path'] = _store(source) if source else None
+            if source:
+                stored.append(values['file_path'])
+            values.update(status='available', uploaded_by=uploader_id, created_at=now, updated_at=now)
+        db.session.execute(sa.insert(Book), rows)
+        # The bulk INSERT bypasses the flush hooks that keep counters and cached listings current
+        stats.incr_books(rows)
+        page_cache.books_changed((), listing=True)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        for file_path in stored:
+            storage.release(file_path)
+        raise
+
+
+def _uploader(identifier):
+    user = User.query.filter((User.username == identifier) | (User.email == identifier) |
+                             (User.user_id == (int(identifier) if identifier.isdigit() else None))).first()
+    if user is None:
+        raise click.BadParameter(f'no user {identifier!r}', param_hint='--uploader')
+    if user.is_admin():
+        # Same rule as books.upload
+        raise click.BadParameter('admins cannot upload books', param_hint='--uploader')
+    return user.user_id
+
+
+books_cli = AppGroup('books', help='Manage the book catalog.')
+
+
+@books_cli.command('import')
+@click.argument('manifest', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--uploader', required=True, help='Username, email or id of the user listing the books.')
+@click.option('--files', 'files_dir', type=click.Path(exists=True, file_okay=False),
+              help='Directory the manifest\'s "file" column is relative to.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Manifest format (default: from the file extension).')
+@click.option('--batch-size', type=click.IntRange(1), default=DEFAULT_BATCH, show_default=True)
+@click.option('--strict', is_flag=True, help='Stop at the first invalid row.')
+@click.option('--dry-run', is_flag=True, help='Validate the manifest without importing anything.')
+def import_command(manifest, uploader, files_dir, fmt, batch_size, strict, dry_run):
+    """Import books from a CSV or JSONL manifest."""
+    fmt = fmt or ('jsonl' if manifest.name.endswith(('.jsonl', '.ndjson')) else 'csv')
+    files_dir = os.path.realpath(files_dir) if files_dir else None
+    uploader_id = _uploader(uploader)
+    form = _RowForm()
+    rows, sources = [], []
+    imported = invalid = 0
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal imported
+        if rows and not dry_run:
+            write_batch(rows, sources, uploader_id)
+        imported += len(rows)
+        rows.clear()
+        sources.clear()
+        click.echo(f'{imported} rows {"checked" if dry_run else "imported"} '
+                   f'({imported / (time.perf_counter() - start):.0f}/s)', err=True)
+
+    for line, row in read_manifest(manifest, fmt):
+        try:
+            values, source = validate(form, row, files_dir)
+        except InvalidRow as error:
+            invalid += 1
+            click.echo(f'line {line}: {error}', err=True)
+            if strict:
+                raise click.ClickException(f'stopped at line {line}; {imported} rows were imported before it')
+            continue
+        rows.append(values)
+        sources.append(source)
+        if len(rows) >= batch_size:
+            flush()
+    if rows:
+        flush()
+
+    verb = 'would be imported' if dry_run else 'imported'
+    click.echo(f'{imported} books {verb}, {invalid} invalid rows skipped in {time.perf_counter() - start:.1f}s.')
+
+
+def init_app(app):
+    app.cli.add_command(books_cli)
@@ -1,30 +1,63 @@
 # app/books/routes.py
-from flask import render_template, url_for, flash, redirect, request, current_app
-from flask_login import login_required, current_user
 import os
+from datetime import datetime
+from flask import render_template, url_for, flash, redirect, request, current_app, send_file, abort
+from flask_login import login_required, current_user
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
 from app.books.forms import BookForm, SearchForm
-from app.models import Book, User
+from app.models import Book, User, Rental, Transaction
 from app import db
 from app.books import bp
+from app.search import search_books
+from app.pagination import keyset_paginate, offset_paginate
+from app import conditional, db_routing, queries, storage, jobs, page_cache
 
-@bp.route('/catalog')
-def catalog():
-    page = request.args.get('page', 1, type=int)
-    search_form = SearchForm()
-    
-    # Build query based on search parameters
-    query = Book.query.filter_by(status='available')
+def _catalog_page(query, with_total=True):
+    """Filter and paginate ``query`` over available books from the request args."""
+    cursor = request.args.get('cursor')
+    query = query.filter(Book.status == 'available')
     
     search = request.args.get('search')
     category = request.args.get('category')
     
     if search:
-        query = query.filter(Book.title.contains(search) | Book.author.contains(search))
+        query = search_books(query, search)
     if category:
-        query = query.filter_by(category=category)
+        query = query.filter(Book.category == category)
     
-    books = query.paginate(page=page, per_page=12, error_out=False)
+    if search:
+        # Ranked results have no stable key, so they page by offset
+        return offset_paginate(query, cursor, per_page=12, with_total=with_total)
+    return keyset_paginate(query, (Book.created_at, Book.book_id), cursor, per_page=12, with_total=with_total)
+
+
+def _my_books_page(query, with_total=True):
+    return keyset_paginate(query.filter(Book.uploaded_by == current_user.user_id),
+                           (Book.created_at, Book.book_id), request.args.get('cursor'), per_page=12,
+                           with_total=with_total)
+
+
+def _probe(page):
+    """The (book_id, updated_at) pairs ``page`` would list, without totals or relationships."""
+    def rows(**view_args):
+        query = db.session.query(Book).with_entities(Book.book_id, Book.created_at, Book.updated_at)
+        return [(row.book_id, row.updated_at) for row in page(query, with_total=False).items]
+    return rows
+
+
+def _book_probe(book_id):
+    updated_at = db.session.query(Book.updated_at).filter(Book.book_id == book_id).first()
+    return [(book_id, updated_at[0])] if updated_at else None
+
+
+@bp.route('/catalog')
+@conditional.validated(_probe(_catalog_page))
+@page_cache.cached_page
+def catalog():
+    page_cache.tag('catalog')
+    search_form = SearchForm()
+    books = _catalog_page(Book.query)
     
     return render_template('books/catalog.html', 
                          title='Book Catalog', 
@@ -32,8 +65,11 @@ def catalog():
                          search_form=search_form)
 
 @bp.route('/book/<int:book_id>')
+@conditional.validated(_book_probe)
+@page_cache.cached_page
 def book_detail(book_id):
-    book = Book.query.get_or_404(book_id)
+    page_cache.tag(f'book:{book_id}')
+    book = queries.books('book_list').filter(Book.book_id == book_id).first_or_404()
     return render_template('books/book_detail.html', title=book.title, book=book)
 
 @bp.route('/upload', methods=['GET', 'POST'])
@@ -46,17 +82,9 @@ def upload():
     
     form = BookForm()
     if form.validate_on_submit():
-        # Handle file upload
+        # Handle file upload (streamed into the content-addressed store, see app/storage.py)
         if form.book_file.data:
-            filename = secure_filename(form.book_file.data.filename)
-            # Store files in static/uploads/books/
-            upload_folder = os.path.join(current_app.root_path, 'static', 'uploads', 'books')
-            os.makedirs(upload_folder, exist_ok=True)  # Create directory if it doesn't exist
-            file_path = os.path.join(upload_folder, filename)
-            form.book_file.data.save(file_path)
-            
-            # Store relative path for web access
-            relative_path = f"uploads/books/{filename}"
+            relative_path = storage.save(form.book_file.data)
         else:
             relative_path = None
         
@@ -83,13 +111,13 @@ def upload():
 
 @bp.route('/my-books')
 @login_required
+@conditional.validated(_probe(_my_books_page))
 def my_books():
-    page = request.args.get('page', 1, type=int)
-    books = Book.query.filter_by(uploaded_by=current_user.user_id)\
-                     .paginate(page=page, per_page=12, error_out=False)
+    books = _my_books_page(Book.query)
     return render_template('books/my_books.html', title='My Books', books=books)
 
 @bp.route('/delete/<int:book_id>')
+@db_routing.use_primary
 @login_required
 def delete_book(book_id):
     book = Book.query.get_or_404(book_id)
@@ -99,31 +127,75 @@ def delete_book(book_id):
         flash('You can only delete your own books.', 'danger')
         return redirect(url_for('books.my_books'))
     
-    # Delete file if exists
-    if book.file_path and os.path.exists(book.file_path):
-        os.remove(book.file_path)
-    
+    # Delete the file in the background once no other book shares it
+    if book.file_path:
+        jobs.enqueue('storage.release', file_path=book.file_path)
     db.session.delete(book)
     db.session.commit()
     
     flash('Book has been deleted.', 'success')
     return redirect(url_for('books.my_books'))
 
-# Add this debug route
-@bp.route('/debug-book-file/<int:book_id>')
-def debug_book_file(book_id):
+def _can_read(book):
+    if current_user.is_admin() or book.uploaded_by == current_user.user_id:
+        return True
+    if book.status == 'available':
+        # Anyone signed in may preview a book before acquiring it
+        return True
+    return db.session.query(Rental.rental_id)\
+        .join(Transaction, Rental.transaction_id == Transaction.transaction_id)\
+        .filter(Transaction.book_id == book.book_id,
+                Transaction.user_id == current_user.user_id,
+                Rental.is_active == True,  # noqa: E712
+                Rental.end_date > datetime.utcnow())\
+        .first() is not None
+
+
+def _offloaded(path, mode, etag, last_modified, download_name, as_attachment):
+    """Hand the byte copying (and Range handling) to the front proxy."""
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(mimetype='application/pdf')
+        if mode == 'x-accel':
+            relative = os.path.relpath(path, current_app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = current_app.config['BOOK_FILE_ACCEL_PREFIX'].rstrip('/') + '/' + relative
+        else:
+            response.headers['X-Sendfile'] = path
+        disposition = 'attachment' if as_attachment else 'inline'
+        response.headers.set('Content-Disposition', disposition, filename=download_name)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
+@bp.route('/book/<int:book_id>/file')
+@login_required
+def download(book_id):
+    """Serve a book's PDF with Range support and strong (content hash) ETags."""
     book = Book.query.get_or_404(book_id)
+    if not _can_read(book):
+        flash('Rent or purchase this book to open it.', 'warning')
+        return redirect(url_for('books.book_detail', book_id=book.book_id))
+    
+    path = storage.path_for(book)
+    if not path or not os.path.isfile(path):
+        abort(404)
     
-    # Build the expected URL
-    expected_url = url_for('static', filename='uploads/books/' + book.file_path, _external=True) if book.file_path else None
+    etag = storage.content_hash(path)
+    last_modified = datetime.utcfromtimestamp(os.path.getmtime(path))
+    download_name = f"{secure_filename(book.title) or 'book'}.pdf"
+    as_attachment = request.args.get('download') == '1'
     
-    return f"""
-    <h3>Book File Debug</h3>
-    <strong>Book:</strong> {book.title} (ID: {book.book_id})<br>
-    <strong>File path in database:</strong> {book.file_path}<br>
-    <strong>Expected URL:</strong> {expected_url}<br>
-    <strong>Test Link:</strong> <a href="{expected_url}" target="_blank">{expected_url}</a><br>
-    <br>
-    <strong>Manual Test URLs:</strong><br>
-    <a href="/static/uploads/books/{book.file_path}" target="_blank">/static/uploads/books/{book.file_path}</a>
-    """
\ No newline at end of file
+    mode = current_app.config.get('BOOK_FILE_SENDFILE')
+    if mode in ('x-sendfile', 'x-accel'):
+        response = _offloaded(path, mode, etag, last_modified, download_name, as_attachment)
+    else:
+        # send_file answers If-None-Match/If-Modified-Since and Range/If-Range itself
+        response = send_file(path, mimetype='application/pdf', as_attachment=as_attachment,
+                             download_name=download_name, conditional=True,
+                             etag=etag, last_modified=last_modified)
+        # Advertise resumability on full responses too (werkzeug only sets it on 206s)
+        response.accept_ranges = 'bytes'
+    response.cache_control.private = True
+    return response
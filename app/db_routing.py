@@ -0,0 +1,158 @@
+# app/db_routing.py
+"""Send read-only queries to a replica database.
+
+With DB_REPLICA_URL set, the ``replica`` bind gets its own engine and
+``RoutingSession`` picks an engine per statement:
+
+* INSERT/UPDATE/DELETE, flushes, ``SELECT ... FOR UPDATE`` -> primary
+* any SELECT after the request has written -> primary (read-after-write);
+  writes are also seen on the primary engine itself, so statements run on
+  ``db.session.connection()`` count too
+* other SELECTs -> replica, when the endpoint allows it
+
+DB_REPLICA_ROUTES sets which endpoints allow it: ``get`` (every GET/HEAD
+request) or ``marked`` (only views decorated with ``@use_replica``).
+``@use_primary`` opts a view out either way.  After a request commits a
+write, that browser session reads from the primary for DB_REPLICA_LAG
+seconds so the user sees their own change.  CLI commands and jobs always use
+the primary.
+
+A replica can be a second server or a local SQLite copy refreshed by
+``flask replica sync`` (or the ``replica.sync`` periodic job).
+"""
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+import click
+import sqlalchemy as sa
+from flask import current_app, has_app_context, has_request_context, request, session as http_session
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+_WROTE = 'db_routing.wrote'  # session.info: this request has written through the primary
+_FORCE_PRIMARY = 'db_routing.primary'  # session.info: depth of ``primary()`` blocks
+_STICKY = '_db_primary_until'  # flask session: read from the primary until this time
+_WRITE_SQL = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+def use_replica(view):
+    """Let this view's reads go to the replica, whatever DB_REPLICA_ROUTES says."""
+    view.db_route = 'replica'
+    return view
+
+
+def use_primary(view):
+    """Keep every query of this view on the primary."""
+    view.db_route = 'primary'
+    return view
+
+
+def _endpoint_allows_replica():
+    if not has_request_context() or request.endpoint is None:
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    route = getattr(view, 'db_route', None)
+    if route is not None:
+        return route == 'replica'
+    return (current_app.config.get('DB_REPLICA_ROUTES', 'get') == 'get'
+            and request.method in ('GET', 'HEAD'))
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BIND in self._db.engines:
+            if getattr(clause, 'is_dml', False):
+                self.info[_WROTE] = True
+            elif self._replica_ok(clause):
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_ok(self, clause):
+        if not isinstance(clause, sa.sql.Select) or clause._for_update_arg is not None:
+            return False
+        if self._flushing or self.info.get(_WROTE) or self.info.get(_FORCE_PRIMARY):
+            return False
+        if not _endpoint_allows_replica():
+            return False
+        return http_session.get(_STICKY, 0) < time.time()
+
+
+@contextmanager
+def primary():
+    """Run the enclosed queries on the primary (e.g. to fill a shared cache)."""
+    from app import db
+    info = db.session.info
+    info[_FORCE_PRIMARY] = info.get(_FORCE_PRIMARY, 0) + 1
+    try:
+        yield
+    finally:
+        info[_FORCE_PRIMARY] -= 1
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.info[_WROTE] = True
+
+
+def _mark_write(conn, cursor, statement, parameters, context, executemany):
+    # Core statements on db.session.connection() never reach get_bind with their clause
+    if context.isinsert or context.isupdate or context.isdelete or _WRITE_SQL.match(statement):
+        from app import db
+        if has_app_context():
+            db.session.info[_WROTE] = True
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.info.get(_WROTE) and has_request_context() and REPLICA_BIND in session._db.engines:
+        http_session[_STICKY] = time.time() + current_app.config.get('DB_REPLICA_LAG', 5)
+
+
+def _sqlite_path(engine):
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return None
+    return engine.url.database
+
+
+def sync_copy():
+    """Refresh a local SQLite replica from the primary with the online backup API."""
+    from app import db
+    source, target = _sqlite_path(db.engines[None]), _sqlite_path(db.engines[REPLICA_BIND])
+    if not source or not target:
+        raise click.ClickException('replica sync only copies between two SQLite files')
+    start = time.perf_counter()
+    with sqlite3.connect(source) as primary_db, sqlite3.connect(target) as replica_db:
+        primary_db.backup(replica_db)
+    return time.perf_counter() - start
+
+
+replica_cli = AppGroup('replica', help='Manage the read replica.')
+
+
+@replica_cli.command('sync')
+def sync_command():
+    """Copy the primary SQLite database over the local replica file."""
+    from app import db
+    if REPLICA_BIND not in db.engines:
+        raise click.ClickException('DB_REPLICA_URL is not set')
+    click.echo(f'Replica refreshed in {sync_copy():.2f}s.')
+
+
+def _sync_job():
+    current_app.logger.info('Replica refreshed in %.2fs', sync_copy())
+
+
+def init_app(app):
+    # Imported here: this module is loaded before ``db`` exists, to build its session class
+    from app import db, jobs
+    app.cli.add_command(replica_cli)
+    jobs.task('replica.sync')(_sync_job)
+    with app.app_context():
+        has_replica = REPLICA_BIND in db.engines
+        primary_engine = db.engines[None]
+    if has_replica:
+        sa.event.listen(primary_engine, 'before_cursor_execute', _mark_write)
+    if has_replica and app.config.get('DB_REPLICA_SYNC_INTERVAL'):
+        jobs.periodic('replica.sync', app.config['DB_REPLICA_SYNC_INTERVAL'])
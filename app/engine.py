@@ -0,0 +1,67 @@
+# app/engine.py
+"""Connection tuning for SQLite engines.
+
+SQLITE_PRAGMAS is applied to every new DBAPI connection of every SQLite
+engine the app uses (the default bind and any extra binds).  The production
+profile turns on WAL so readers no longer wait for the writer, relaxes fsyncs
+to ``synchronous=NORMAL`` (still durable at each checkpoint in WAL mode), and
+gives writers a busy timeout instead of an immediate "database is locked".
+SQLITE_CONNECT_ARGS are added to the ``sqlite3.connect()`` arguments of
+the same engines, leaving any non-SQLite engine's driver alone.
+
+Engines created before a fork (gunicorn ``--preload``) are disposed in the
+child so no pooled connection is shared between processes.
+"""
+import os
+import weakref
+import sqlalchemy as sa
+from app import db
+
+_engines = weakref.WeakSet()  # engines whose pools must not survive a fork
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def _connect_args(arguments):
+    def do_connect(dialect, connection_record, cargs, cparams):
+        cparams.update(arguments)
+    return do_connect
+
+
+def _after_fork_in_child():
+    for engine in list(_engines):
+        # close=False: leave the parent's connections alone, just forget them here
+        engine.dispose(close=False)
+
+
+def pragmas(engine):
+    """Current values of the tuned pragmas, for checking a deployment."""
+    with engine.connect() as connection:
+        return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')}
+
+
+def init_app(app):
+    settings = app.config.get('SQLITE_PRAGMAS') or {}
+    connect_args = app.config.get('SQLITE_CONNECT_ARGS') or {}
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        _engines.add(engine)
+        if connect_args and engine.dialect.name == 'sqlite':
+            sa.event.listen(engine, 'do_connect', _connect_args(connect_args))
+        # In-memory databases can't use WAL or mmap, and tests run on them
+        if settings and engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+            sa.event.listen(engine, 'connect', _apply_pragmas(settings))
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
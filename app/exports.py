@@ -0,0 +1,157 @@
+# app/exports.py
+"""Transaction journal export as CSV or JSONL.
+
+One row per transaction with the buyer, the book, the seller and the rental
+period.  The seller comes from the ledger's credit entry for the transaction:
+a purchase hands the book to the buyer, so ``Book.uploaded_by`` no longer
+says who was paid.
+
+Rows are read with ``yield_per`` (a server-side cursor where the driver has
+one) and written out in chunks, so memory use does not grow with the size
+of the export.  ``/admin/transactions/export`` streams the same rows as the
+``flask transactions export`` command; gunicorn.conf.py uses threaded
+workers so a long download doesn't trip the worker timeout.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import User, Wallet, Book, Transaction, Rental, LedgerEntry
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+TYPES = ('purchase', 'rental')
+YIELD_PER = 1000  # rows fetched from the cursor at a time
+CHUNK_ROWS = 500  # rows per chunk written to the response/file
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')  # start a formula in spreadsheet apps
+
+_buyer = aliased(User, name='buyer')
+_seller = aliased(User, name='seller')
+_credit = aliased(LedgerEntry, name='credit')
+_seller_wallet = aliased(Wallet, name='seller_wallet')
+
+COLUMNS = (
+    ('transaction_id', Transaction.transaction_id),
+    ('created_at', Transaction.created_at),
+    ('type', Transaction.transaction_type),
+    ('status', Transaction.status),
+    ('amount', Transaction.amount),
+    ('buyer_id', Transaction.user_id),
+    ('buyer_username', _buyer.username),
+    ('buyer_email', _buyer.email),
+    ('buyer_student_id', _buyer.student_id),
+    ('book_id', Transaction.book_id),
+    ('book_title', Book.title),
+    ('book_author', Book.author),
+    ('book_isbn', Book.isbn),
+    ('book_category', Book.category),
+    ('seller_id', _seller.user_id),
+    ('seller_username', _seller.username),
+    ('rental_start', Rental.start_date),
+    ('rental_end', Rental.end_date),
+    ('rental_active', Rental.is_active),
+)
+
+
+def parse_day(value, name):
+    """A YYYY-MM-DD filter value as a datetime, or None; ValueError names the field."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'{name} must be a date like 2024-01-31') from None
+
+
+def journal_query(start=None, end=None, types=None):
+    """Transactions created on or after ``start`` and before the day after ``end``, oldest first."""
+    statement = sa.select(*(column.label(name) for name, column in COLUMNS))\
+        .select_from(Transaction)\
+        .join(_buyer, _buyer.user_id == Transaction.user_id)\
+        .join(Book, Book.book_id == Transaction.book_id)\
+        .outerjoin(_credit, (_credit.transaction_id == Transaction.transaction_id)
+                   & _credit.entry_type.in_(('sale', 'rental_income')))\
+        .outerjoin(_seller_wallet, _seller_wallet.wallet_id == _credit.wallet_id)\
+        .outerjoin(_seller, _seller.user_id == _seller_wallet.user_id)\
+        .outerjoin(Rental, Rental.transaction_id == Transaction.transaction_id)\
+        .order_by(Transaction.created_at, Transaction.transaction_id)
+    if start is not None:
+        statement = statement.where(Transaction.created_at >= start)
+    if end is not None:
+        statement = statement.where(Transaction.created_at < end + timedelta(days=1))
+    if types:
+        statement = statement.where(Transaction.transaction_type.in_(types))
+    return statement.execution_options(yield_per=YIELD_PER)
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def _cell(value):
+    """A CSV cell: text that a spreadsheet would run as a formula gets a leading quote."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream(statement, fmt):
+    """Yield the export as text chunks of CHUNK_ROWS rows, CSV with a header line."""
+    names = [name for name, _ in COLUMNS]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(names)
+    rows = 0
+    for row in db.session.execute(statement):
+        values = [_value(value) for value in row]
+        if writer:
+            writer.writerow([_cell(value) for value in values])
+        else:
+            buffer.write(json.dumps(dict(zip(names, values))))
+            buffer.write('\n')
+        rows += 1
+        if rows % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def filename(fmt, start=None, end=None):
+    span = '-'.join(day.strftime('%Y%m%d') for day in (start, end) if day) or 'all'
+    return f'transactions-{span}.{fmt}'
+
+
+transactions_cli = AppGroup('transactions', help='Transaction journal tools.')
+
+
+@transactions_cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv', show_default=True)
+@click.option('--start', help='First day to include (YYYY-MM-DD).')
+@click.option('--end', help='Last day to include (YYYY-MM-DD).')
+@click.option('--type', 'types', type=click.Choice(TYPES), multiple=True, help='Only these types (repeatable).')
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8', lazy=True), default='-',
+              help='File to write (default: stdout).')
+def export_command(fmt, start, end, types, output):
+    """Write the transaction journal as CSV or JSONL."""
+    try:
+        start, end = parse_day(start, '--start'), parse_day(end, '--end')
+    except ValueError as error:
+        raise click.BadParameter(str(error)) from None
+    for chunk in stream(journal_query(start, end, types), fmt):
+        output.write(chunk)
+    output.flush()
+
+
+def init_app(app):
+    app.cli.add_command(transactions_cli)
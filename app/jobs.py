@@ -0,0 +1,302 @@
+# app/jobs.py
+"""Durable background jobs backed by the ``jobs`` table.
+
+``enqueue()`` adds a row in the caller's transaction, so a job exists only if
+the request's own changes commit, and survives restarts once it does.  Jobs
+are claimed with a conditional UPDATE (one runner wins), retried with
+exponential backoff, and marked ``failed`` after ``max_attempts``.
+
+JOBS_MODE decides who runs them:
+
+* ``thread`` -- a small thread pool inside each app process, woken right
+  after the enqueuing transaction commits (default)
+* ``worker`` -- only ``flask jobs run`` processes execute jobs
+* ``sync``   -- jobs run at the end of the request that queued them (tests);
+  outside a request call ``run_pending()`` after committing
+"""
+import json
+import os
+import random
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import click
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from app import db
+from app.models import Job
+
+_PENDING = 'jobs.pending'  # session.info: jobs added in the open transaction
+_COMMITTED = 'jobs.committed'  # session.info: sync mode, run them after the request
+
+_tasks = {}
+_periodic = {}  # task name -> interval in seconds
+
+
+def task(name):
+    """Register a function as a job; it is called with the enqueued keyword arguments."""
+    def register(func):
+        _tasks[name] = func
+        return func
+    return register
+
+
+def periodic(name, interval):
+    """Have runners keep ``name`` scheduled every ``interval`` seconds."""
+    _periodic[name] = interval
+
+
+def enqueue(name, delay=0, max_attempts=None, **payload):
+    """Queue ``name(**payload)`` to run after the current transaction commits."""
+    if name not in _tasks:
+        raise KeyError(f'Unknown job {name!r}')
+    job = Job(
+        name=name,
+        payload=json.dumps(payload),
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        max_attempts=max_attempts or current_app.config.get('JOBS_MAX_ATTEMPTS', 5),
+    )
+    db.session.add(job)
+    db.session.info[_PENDING] = True
+    return job
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: doubling from JOBS_BACKOFF, capped, jittered."""
+    base = current_app.config.get('JOBS_BACKOFF', 5)
+    delay = min(base * 2 ** max(attempts - 1, 0), current_app.config.get('JOBS_BACKOFF_MAX', 3600))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _ready(now):
+    lease = now - timedelta(seconds=current_app.config.get('JOBS_LEASE', 300))
+    return sa.or_(
+        sa.and_(Job.status == 'queued', Job.run_at <= now),
+        # A runner that died mid-job: take it over once its lease expires
+        sa.and_(Job.status == 'running', Job.locked_at < lease),
+    )
+
+
+def claim(worker, limit):
+    """Atomically take up to ``limit`` due jobs for ``worker``; returns their ids."""
+    now = datetime.utcnow()
+    ready = _ready(now)
+    candidates = [job_id for (job_id,) in db.session.query(Job.job_id).filter(ready)
+                                            .order_by(Job.run_at).limit(limit)]
+    claimed = []
+    for job_id in candidates:
+        result = db.session.execute(
+            sa.update(Job)
+              .where(Job.job_id == job_id, ready)
+              .values(status='running', locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+              .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def execute(job_id):
+    """Run one claimed job and record the outcome."""
+    job = db.session.get(Job, job_id)
+    name, payload = job.name, json.loads(job.payload or '{}')
+    try:
+        if name not in _tasks:
+            raise LookupError(f'No task registered as {name!r}')
+        _tasks[name](**payload)
+        job = db.session.get(Job, job_id)
+        job.status, job.finished_at, job.last_error = 'done', datetime.utcnow(), None
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = traceback.format_exc(limit=10)
+        job.locked_by = job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status, job.finished_at = 'failed', datetime.utcnow()
+        else:
+            job.status = 'queued'
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff(job.attempts))
+        db.session.commit()
+        current_app.logger.warning('Job %s (%s) failed on attempt %s/%s', job_id, name,
+                                   job.attempts, job.max_attempts, exc_info=True)
+        return False
+
+
+def schedule_periodic():
+    """Queue the next run of each periodic task that has none queued or running."""
+    now = datetime.utcnow()
+    for name, interval in _periodic.items():
+        pending = db.session.query(Job.job_id)\
+                            .filter(Job.status.in_(('queued', 'running')), Job.name == name).first()
+        if pending:
+            continue
+        last = db.session.query(db.func.max(Job.finished_at)).filter(Job.name == name).scalar()
+        delay = (last + timedelta(seconds=interval) - now).total_seconds() if last else 0
+        enqueue(name, delay=max(delay, 0))
+    db.session.commit()
+
+
+def _worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def run_pending(limit=None):
+    """Claim and run due jobs in this thread until none are left (or ``limit`` ran)."""
+    worker, ran = _worker_name(), 0
+    while limit is None or ran < limit:
+        ids = claim(worker, 1)
+        if not ids:
+            break
+        execute(ids[0])
+        ran += 1
+    return ran
+
+
+class Runner:
+    """Polls the queue and fans claimed jobs out to a thread pool."""
+
+    def __init__(self, app, threads=2, poll=5.0):
+        self.app = app
+        self.threads = threads
+        self.poll = poll
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.pid = os.getpid()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='jobs')
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _execute(self, job_id):
+        with self.app.app_context():
+            execute(job_id)
+
+    def run_batch(self):
+        with self.app.app_context():
+            if _periodic:
+                schedule_periodic()
+            ids = claim(self.worker, self.threads)
+        wait([self._pool.submit(self._execute, job_id) for job_id in ids])
+        return len(ids)
+
+    def run_forever(self, once=False):
+        while not self._stop.is_set():
+            try:
+                ran = self.run_batch()
+            except Exception:
+                self.app.logger.exception('Job runner poll failed')
+                ran = 0
+            if ran:
+                continue
+            if once:
+                break
+            self._wake.wait(self.poll)
+            self._wake.clear()
+        self._pool.shutdown(wait=True)
+
+    def start(self):
+        thread = threading.Thread(target=self.run_forever, name='jobs-runner', daemon=True)
+        thread.start()
+        return self
+
+
+_runner_lock = threading.Lock()
+
+
+def _in_process_runner(app):
+    """The app's background runner, (re)started lazily so forked workers get their own."""
+    with _runner_lock:
+        runner = app.extensions.get('jobs')
+        if runner is None or runner.pid != os.getpid():
+            runner = Runner(app, app.config.get('JOBS_THREADS', 2), app.config.get('JOBS_POLL', 5.0)).start()
+            app.extensions['jobs'] = runner
+        return runner
+
+
+def _after_commit(session):
+    if not session.info.pop(_PENDING, False) or not has_app_context():
+        return
+    mode = current_app.config.get('JOBS_MODE', 'thread')
+    if mode == 'thread':
+        _in_process_runner(current_app._get_current_object()).wake()
+    elif mode == 'sync':
+        session.info[_COMMITTED] = True
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def _start_runner():
+    # Periodic tasks need the in-process runner even before anything is enqueued
+    if _periodic and current_app.config.get('JOBS_MODE', 'thread') == 'thread':
+        _in_process_runner(current_app._get_current_object())
+
+
+def _run_committed(response):
+    if db.session.info.pop(_COMMITTED, False):
+        run_pending()
+    return response
+
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_cli.command('run')
+@click.option('--threads', type=int, default=None, help='Jobs executed in parallel (default JOBS_THREADS).')
+@click.option('--poll', type=float, default=None, help='Seconds between polls when idle (default JOBS_POLL).')
+@click.option('--once', is_flag=True, help='Exit once no job is due instead of polling forever.')
+def run_command(threads, poll, once):
+    """Process queued jobs until interrupted."""
+    app = current_app._get_current_object()
+    runner = Runner(app, threads or app.config.get('JOBS_THREADS', 2), poll or app.config.get('JOBS_POLL', 5.0))
+    # Commits made here (periodic scheduling, jobs enqueued by jobs) wake this runner
+    # instead of starting a second, in-process one that outlives --once
+    app.extensions['jobs'] = runner
+    click.echo(f'Job runner {runner.worker} started with {runner.threads} threads.')
+    try:
+        runner.run_forever(once=once)
+    except KeyboardInterrupt:
+        runner.stop()
+
+
+@jobs_cli.command('status')
+def status_command():
+    """Show job counts per status and the most recent failures."""
+    for status, count in db.session.query(Job.status, db.func.count()).group_by(Job.status):
+        click.echo(f'{status:>8}: {count}')
+    for job in Job.query.filter_by(status='failed').order_by(Job.finished_at.desc()).limit(5):
+        last_line = (job.last_error or '').strip().splitlines()[-1:] or ['']
+        click.echo(f'failed #{job.job_id} {job.name} after {job.attempts} attempts: {last_line[0]}')
+
+
+@jobs_cli.command('prune')
+@click.option('--days', type=int, default=7, show_default=True)
+def prune_command(days):
+    """Delete finished jobs older than DAYS."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = Job.query.filter(Job.status.in_(('done', 'failed')), Job.finished_at < cutoff)\
+                       .delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Deleted {deleted} jobs.')
+
+
+def init_app(app):
+    app.cli.add_command(jobs_cli)
+    app.before_request(_start_runner)
+    app.after_request(_run_committed)
+
+
+sa.event.listen(db.session, 'after_commit', _after_commit)
+sa.event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,270 @@
+# app/ledger.py
+from datetime import datetime
+import click
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from flask.cli import AppGroup
+from app import db, jobs, metrics, page_cache, stats, user_cache
+from app.models import Wallet, LedgerEntry, Book, to_cents
+
+# Entry types that count towards Wallet.earned_cents / Wallet.spent_cents
+EARNING_TYPES = ('sale', 'rental_income')
+SPENDING_TYPES = ('purchase', 'rental')
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+class BookUnavailable(Exception):
+    pass
+
+
+def _create_wallet(user_id):
+    """INSERT an empty wallet unless the user has one; safe when two requests race to create it."""
+    table = Wallet.__table__
+    connection = db.session.connection()
+    insert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(connection.dialect.name)
+    if insert is not None:
+        connection.execute(insert(table).values(user_id=user_id, balance_cents=0)
+                           .on_conflict_do_nothing(index_elements=[table.c.user_id]))
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(user_id=user_id, balance_cents=0))
+    except IntegrityError:
+        pass  # the other request's wallet is the one we re-read
+
+
+def _wallet_id(user_id, create=False):
+    query = db.session.query(Wallet.wallet_id).filter(Wallet.user_id == user_id)
+    wallet_id = query.scalar()
+    if wallet_id is None and create:
+        _create_wallet(user_id)
+        wallet_id = query.scalar()
+    return wallet_id
+
+
+def _expire_wallet(wallet_id):
+    # The UPDATE bypasses the ORM, so drop any cached balance for this wallet
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Wallet) and obj.wallet_id == wallet_id:
+            db.session.expire(obj, ['balance_cents', 'earned_cents', 'spent_cents', 'updated_at'])
+
+
+def _totals(cents, entry_type):
+    """The (earned, spent) increments an entry of ``entry_type`` adds to its wallet."""
+    if entry_type in EARNING_TYPES:
+        return cents, 0
+    if entry_type in SPENDING_TYPES:
+        return 0, -cents
+    return 0, 0
+
+
+def _adjust(wallet_id, cents, guard, earned=0, spent=0):
+    values = {'balance_cents': Wallet.balance_cents + cents, 'updated_at': datetime.utcnow()}
+    # The running totals ride along in the same UPDATE, so they commit or roll back with the balance
+    if earned:
+        values['earned_cents'] = Wallet.earned_cents + earned
+    if spent:
+        values['spent_cents'] = Wallet.spent_cents + spent
+    statement = sa.update(Wallet)\
+        .where(Wallet.wallet_id == wallet_id)\
+        .values(**values)\
+        .execution_options(synchronize_session=False)
+    if guard:
+        statement = statement.where(Wallet.balance_cents >= -cents)
+    if db.session.execute(statement).rowcount != 1:
+        return False
+    _expire_wallet(wallet_id)
+    return True
+
+
+def _move(wallet_id, cents, entry_type, transaction_id, guard):
+    earned, spent = _totals(cents, entry_type)
+    if not _adjust(wallet_id, cents, guard, earned, spent):
+        return False
+    db.session.add(LedgerEntry(wallet_id=wallet_id, transaction_id=transaction_id,
+                               amount_cents=cents, entry_type=entry_type))
+    return True
+
+
+def credit(user_id, cents, entry_type, transaction_id=None):
+    """Add ``cents`` to the user's wallet (created if missing) and record it."""
+    _move(_wallet_id(user_id, create=True), cents, entry_type, transaction_id, guard=False)
+    user_cache.invalidate(user_id)
+    if entry_type == 'deposit':
+        metrics.funds_added(cents)
+
+
+def debit(user_id, cents, entry_type, transaction_id=None):
+    """Take ``cents`` from the user's wallet.
+
+    A single ``UPDATE ... WHERE balance_cents >= :cents`` decides whether the
+    funds are there, so concurrent debits can never overdraw or lose updates.
+    Raises InsufficientFunds (caller rolls back) when it matches no row.
+    """
+    wallet_id = _wallet_id(user_id)
+    if wallet_id is None or not _move(wallet_id, -cents, entry_type, transaction_id, guard=True):
+        raise InsufficientFunds()
+    user_cache.invalidate(user_id)
+
+
+def transfer(from_user_id, to_user_id, cents, debit_type, credit_type, transaction_id=None):
+    debit(from_user_id, cents, debit_type, transaction_id)
+    credit(to_user_id, cents, credit_type, transaction_id)
+
+
+def settle(payer_id, lines):
+    """Settle a batch of payments from one payer in the current transaction.
+
+    ``lines`` are ``(transaction_id, payee_user_id, cents, debit_type, credit_type)``.
+    The payer is debited the total with one guarded UPDATE (InsufficientFunds if
+    it doesn't cover everything), each payee is credited once with their share,
+    and every line gets its pair of ledger entries in one bulk INSERT.
+    """
+    payee_ids = {line[1] for line in lines}
+    wallets = dict(db.session.query(Wallet.user_id, Wallet.wallet_id)
+                             .filter(Wallet.user_id.in_(payee_ids | {payer_id})))
+    if payer_id not in wallets:
+        raise InsufficientFunds()
+    for user_id in payee_ids - wallets.keys():
+        wallets[user_id] = _wallet_id(user_id, create=True)
+
+    total = sum(line[2] for line in lines)
+    spent = sum(_totals(-line[2], line[3])[1] for line in lines)
+    if not _adjust(wallets[payer_id], -total, guard=True, spent=spent):
+        raise InsufficientFunds()
+    shares, earnings = {}, {}
+    for _, payee_id, cents, _, credit_type in lines:
+        shares[payee_id] = shares.get(payee_id, 0) + cents
+        earnings[payee_id] = earnings.get(payee_id, 0) + _totals(cents, credit_type)[0]
+    for payee_id, cents in shares.items():
+        _adjust(wallets[payee_id], cents, guard=False, earned=earnings[payee_id])
+
+    entries = []
+    for transaction_id, payee_id, cents, debit_type, credit_type in lines:
+        entries.append({'wallet_id': wallets[payer_id], 'transaction_id': transaction_id,
+                        'amount_cents': -cents, 'entry_type': debit_type})
+        entries.append({'wallet_id': wallets[payee_id], 'transaction_id': transaction_id,
+                        'amount_cents': cents, 'entry_type': credit_type})
+    if entries:
+        db.session.execute(sa.insert(LedgerEntry), entries)
+    user_cache.invalidate(payer_id, *payee_ids)
+
+
+def claim_books(book_ids, status, new_owner_id=None):
+    """Bulk claim_book: all of ``book_ids`` move to ``status`` or BookUnavailable is raised."""
+    if not book_ids:
+        return
+    values = {'status': status, 'updated_at': datetime.utcnow()}
+    if new_owner_id is not None:
+        values['uploaded_by'] = new_owner_id
+    result = db.session.execute(
+        sa.update(Book)
+          .where(Book.book_id.in_(book_ids), Book.status == 'available')
+          .values(**values)
+          .execution_options(synchronize_session='evaluate')
+    )
+    if result.rowcount != len(book_ids):
+        raise BookUnavailable()
+    stats.incr({'books.available': -len(book_ids)})
+    page_cache.books_changed(book_ids)
+
+
+def claim_book(book_id, status, new_owner_id=None):
+    """Atomically move an available book to ``status``; BookUnavailable if someone beat us to it."""
+    values = {'status': status, 'updated_at': datetime.utcnow()}
+    if new_owner_id is not None:
+        values['uploaded_by'] = new_owner_id
+    result = db.session.execute(
+        sa.update(Book)
+          .where(Book.book_id == book_id, Book.status == 'available')
+          .values(**values)
+          .execution_options(synchronize_session='evaluate')
+    )
+    if result.rowcount != 1:
+        raise BookUnavailable()
+    # Counters and page-cache invalidation hang off ORM flushes; this UPDATE bypasses them
+    stats.incr({'books.available': -1})
+    page_cache.books_changed([book_id])
+
+
+@jobs.task('wallets.ensure')
+def ensure_wallet(user_id):
+    """Create an empty wallet for users from before wallets existed; a no-op if they have one."""
+    if _wallet_id(user_id) is None:
+        _wallet_id(user_id, create=True)
+        user_cache.invalidate(user_id)
+
+
+def balance_check():
+    """Wallets whose balance disagrees with the sum of their ledger entries."""
+    ledger_sum = db.session.query(
+        LedgerEntry.wallet_id, db.func.sum(LedgerEntry.amount_cents).label('total')
+    ).group_by(LedgerEntry.wallet_id).subquery()
+    return db.session.query(Wallet.wallet_id, Wallet.balance_cents, ledger_sum.c.total)\
+        .outerjoin(ledger_sum, ledger_sum.c.wallet_id == Wallet.wallet_id)\
+        .filter(Wallet.balance_cents != db.func.coalesce(ledger_sum.c.total, 0)).all()
+
+
+def _ledger_totals():
+    """Per-wallet (earned, spent) recomputed from the ledger, as correlated scalar subqueries.
+
+    Each starts from the wallet's opening figure for history older than the ledger.
+    """
+    def total(types, sign, opening):
+        return opening + sa.select(db.func.coalesce(db.func.sum(LedgerEntry.amount_cents * sign), 0))\
+            .where(LedgerEntry.wallet_id == Wallet.wallet_id, LedgerEntry.entry_type.in_(types))\
+            .scalar_subquery()
+    return (total(EARNING_TYPES, 1, Wallet.opening_earned_cents),
+            total(SPENDING_TYPES, -1, Wallet.opening_spent_cents))
+
+
+def totals_check():
+    """Wallets whose earned/spent totals disagree with their ledger entries."""
+    earned, spent = _ledger_totals()
+    return db.session.query(Wallet.wallet_id, Wallet.earned_cents, earned, Wallet.spent_cents, spent)\
+        .filter((Wallet.earned_cents != earned) | (Wallet.spent_cents != spent)).all()
+
+
+def rebuild_totals():
+    """Recompute every wallet's earned/spent totals from its ledger; returns how many changed.
+
+    Only rows that are actually off are written, so it is cheap to run after
+    a restore or a manual ledger fix.  Caller commits.
+    """
+    earned, spent = _ledger_totals()
+    result = db.session.execute(
+        sa.update(Wallet)
+          .where((Wallet.earned_cents != earned) | (Wallet.spent_cents != spent))
+          .values(earned_cents=earned, spent_cents=spent)
+          .execution_options(synchronize_session=False)
+    )
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Wallet):
+            db.session.expire(obj, ['earned_cents', 'spent_cents'])
+    user_cache.clear()
+    return result.rowcount
+
+
+ledger_cli = AppGroup('ledger', help='Wallet ledger maintenance.')
+
+
+@ledger_cli.command('rebuild-totals')
+@click.option('--dry-run', is_flag=True, help='Only report wallets whose totals are off.')
+def rebuild_totals_command(dry_run):
+    """Recompute wallet earnings and spend from the ledger."""
+    if dry_run:
+        for wallet_id, earned, expected_earned, spent, expected_spent in totals_check():
+            click.echo(f'wallet {wallet_id}: earned {earned} (ledger {expected_earned}), '
+                       f'spent {spent} (ledger {expected_spent})')
+        return
+    changed = rebuild_totals()
+    db.session.commit()
+    click.echo(f'{changed} wallets updated.')
+
+
+def init_app(app):
+    app.cli.add_command(ledger_cli)
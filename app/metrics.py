@@ -0,0 +1,179 @@
+# app/metrics.py
+"""Prometheus metrics, served at ``/metrics``.
+
+* ``library_http_request_duration_seconds{blueprint,endpoint,method,status}``:
+  latency histogram; its ``_count`` is the request counter
+* ``library_db_pool_checked_out{bind}`` / ``library_db_pool_size{bind}``
+* ``library_cache_lookups_total{cache,result}``: page and user cache hits and
+  misses, e.g. hit ratio =
+  ``sum(rate(..{result="hit"}[5m])) by (cache) / sum(rate(..[5m])) by (cache)``
+* business counters: ``library_transactions_total{type}``,
+  ``library_transaction_amount_cents_total{type}``,
+  ``library_funds_added_cents_total``, ``library_uploads_total`` and
+  ``library_upload_bytes_total``
+
+Transactions and deposits are counted when their DB transaction commits, so
+a rolled-back purchase never shows up.
+
+Under gunicorn every worker has its own counters.  ``gunicorn.conf.py`` sets
+PROMETHEUS_MULTIPROC_DIR before the app is imported, so prometheus_client
+keeps each worker's values in memory-mapped files there, and a scrape of any
+worker adds up all of them.  Updating a metric is a dict lookup plus a write
+to that file; nothing is sent anywhere until Prometheus scrapes.
+
+With METRICS_TOKEN set, scrapers send ``Authorization: Bearer <token>``.
+Without it only direct loopback clients may scrape: a request carrying
+forwarding headers came through a proxy, whatever its remote address.  The
+production config turns that exemption off, so there ``/metrics`` needs the
+token.
+"""
+import hmac
+import os
+import time
+import sqlalchemy as sa
+from flask import Response, abort, current_app, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               REGISTRY, generate_latest, multiprocess)
+from app import db
+from app.models import Transaction
+
+_PENDING = 'metrics.pending'  # session.info: (counter, amount) to apply on commit
+_LOOPBACK = ('127.0.0.1', '::1')
+_FORWARDED = ('Forwarded', 'X-Forwarded-For', 'X-Forwarded-Host', 'X-Real-IP')
+
+REQUEST_DURATION = Histogram(
+    'library_http_request_duration_seconds', 'Request wall time, first before_request to last after_request.',
+    ('blueprint', 'endpoint', 'method', 'status'),
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+POOL_CHECKED_OUT = Gauge('library_db_pool_checked_out', 'Connections currently in use.', ('bind',),
+                         multiprocess_mode='livesum')
+POOL_SIZE = Gauge('library_db_pool_size', 'Pool size of one worker process.', ('bind',),
+                  multiprocess_mode='livemax')
+CACHE_LOOKUPS = Counter('library_cache_lookups', 'Cache lookups by result.', ('cache', 'result'))
+TRANSACTIONS = Counter('library_transactions', 'Committed transactions.', ('type',))
+TRANSACTION_AMOUNT = Counter('library_transaction_amount_cents', 'Committed transaction amounts.', ('type',))
+FUNDS_ADDED = Counter('library_funds_added_cents', 'Wallet deposits.')
+UPLOADS = Counter('library_uploads', 'Files stored by uploads.')
+UPLOAD_BYTES = Counter('library_upload_bytes', 'Bytes received by uploads.')
+
+_cache_children = {(cache, hit): CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss')
+                   for cache in ('page', 'user') for hit in (True, False)}
+_request_children = {}  # label tuple -> histogram child, skips labels()'s lock on the hot path
+
+
+def cache_lookup(cache, hit):
+    _cache_children[cache, hit].inc()
+
+
+def upload(size):
+    UPLOADS.inc()
+    UPLOAD_BYTES.inc(size)
+
+
+def _on_commit(session, counter, amount=1):
+    session.info.setdefault(_PENDING, []).append((counter, amount))
+
+
+def transaction(transaction_type, cents, session=None):
+    """Count a transaction once the current DB transaction commits.
+
+    ORM-added Transaction rows are picked up automatically; bulk INSERTs call this.
+    """
+    session = session or db.session
+    _on_commit(session, TRANSACTIONS.labels(transaction_type))
+    _on_commit(session, TRANSACTION_AMOUNT.labels(transaction_type), cents)
+
+
+def funds_added(cents):
+    _on_commit(db.session, FUNDS_ADDED, cents)
+
+
+def _track_flush(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            transaction(obj.transaction_type, round((obj.amount or 0) * 100), session)
+
+
+def _after_commit(session):
+    for counter, amount in session.info.pop(_PENDING, ()):
+        counter.inc(amount)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _finish_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        labels = (request.blueprint or '', request.endpoint or 'unmatched', request.method,
+                  str(response.status_code))
+        child = _request_children.get(labels)
+        if child is None:
+            child = _request_children.setdefault(labels, REQUEST_DURATION.labels(*labels))
+        child.observe(time.perf_counter() - start)
+    return response
+
+
+def _pool_listeners(bind, engine):
+    checked_out = POOL_CHECKED_OUT.labels(bind)
+    sa.event.listen(engine, 'checkout', lambda *args: checked_out.inc())
+    sa.event.listen(engine, 'checkin', lambda *args: checked_out.dec())
+    size = getattr(engine.pool, 'size', None)
+    if callable(size):
+        POOL_SIZE.labels(bind).set(size())
+
+
+def _registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def _allowed():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not current_app.config.get('METRICS_ALLOW_LOOPBACK', True):
+        return False
+    # Behind a reverse proxy every request arrives from loopback
+    if any(header in request.headers for header in _FORWARDED):
+        return False
+    return request.remote_addr in _LOOPBACK
+
+
+def metrics_view():
+    if not _allowed():
+        abort(403)
+    return Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def child_exit(server, worker):
+    """gunicorn hook: drop the live gauges of a worker that has exited."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    with app.app_context():
+        engines = dict(db.engines)
+    for bind, engine in engines.items():
+        _pool_listeners(bind or 'default', engine)
+    # Registered right after perf's hooks, so the timing spans the other modules' hooks
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+sa.event.listen(db.session, 'after_flush', _track_flush)
+sa.event.listen(db.session, 'after_commit', _after_commit)
+sa.event.listen(db.session, 'after_rollback', _after_rollback)
@@ -1,8 +1,9 @@
 # app/models.py
 from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from app import db, login_manager
+from app import db
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -36,30 +37,55 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+def to_cents(amount):
+    """Convert a dollar amount (float/str/Decimal) to integer cents, rounding half up."""
+    return int((Decimal(str(amount or 0)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
 class Wallet(db.Model):
     __tablename__ = 'wallets'
 
     wallet_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), unique=True, nullable=False)
-    balance = db.Column(db.Float, default=0.0)
+    # Integer cents; only ever changed through app.ledger (conditional UPDATEs + ledger rows)
+    balance_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    # Running totals kept by the same UPDATEs ('flask ledger rebuild-totals' recomputes them):
+    # sales and rental income received, purchases and rentals paid for
+    earned_cents = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    spent_cents = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    # The part of those totals from transactions older than the ledger (set once by migration)
+    opening_earned_cents = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    opening_spent_cents = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    def add_funds(self, amount):
-        self.balance += amount
-        return True
+    @property
+    def balance(self):
+        return (self.balance_cents or 0) / 100
+
+    @balance.setter
+    def balance(self, amount):
+        # Only meant for the opening balance of a new wallet
+        self.balance_cents = to_cents(amount)
+
+    @property
+    def earned(self):
+        return (self.earned_cents or 0) / 100
 
-    def deduct_funds(self, amount):
-        if self.balance >= amount:
-            self.balance -= amount
-            return True
-        return False
+    @property
+    def spent(self):
+        return (self.spent_cents or 0) / 100
 
     def __repr__(self):
         return f'<Wallet {self.wallet_id} - User {self.user_id}>'
 
 class Book(db.Model):
     __tablename__ = 'books'
+    # Catalog (status[, category]) and my_books/earnings (uploaded_by) page newest-first
+    __table_args__ = (
+        db.Index('ix_books_status_created_at', 'status', 'created_at'),
+        db.Index('ix_books_status_category_created_at', 'status', 'category', 'created_at'),
+        db.Index('ix_books_uploaded_by_created_at', 'uploaded_by', 'created_at'),
+    )
 
     book_id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False, index=True)
@@ -68,7 +94,7 @@ class Book(db.Model):
     description = db.Column(db.Text)
     price = db.Column(db.Float, default=0.0)  # Sale price
     rental_fee = db.Column(db.Float, default=0.0)  # Daily rental fee
-    file_path = db.Column(db.String(500))
+    file_path = db.Column(db.String(500), index=True)  # relative to UPLOAD_FOLDER, see app/storage.py
     status = db.Column(db.String(20), default='available')  # available, rented, sold
     category = db.Column(db.String(50))
     uploaded_by = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -83,6 +109,12 @@ class Book(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    # Dashboard/history feeds (per user and global, newest first) and per-book earnings
+    __table_args__ = (
+        db.Index('ix_transactions_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_transactions_created_at', 'created_at'),
+        db.Index('ix_transactions_book_id', 'book_id'),
+    )
 
     transaction_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -100,9 +132,11 @@ class Transaction(db.Model):
 
 class Rental(db.Model):
     __tablename__ = 'rentals'
+    # The expiry sweeper scans active rentals in end_date order (see app/rentals.py)
+    __table_args__ = (db.Index('ix_rentals_is_active_end_date', 'is_active', 'end_date'),)
 
     rental_id = db.Column(db.Integer, primary_key=True)
-    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.transaction_id'), nullable=False) 
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.transaction_id'), nullable=False, index=True)
     start_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     end_date = db.Column(db.DateTime, nullable=False, default=lambda: datetime.utcnow() + timedelta(days=7))
     is_active = db.Column(db.Boolean, default=True)
@@ -116,6 +150,73 @@ class Rental(db.Model):
     def __repr__(self):
         return f'<Rental {self.rental_id}>'
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+class LedgerEntry(db.Model):
+    __tablename__ = 'wallet_ledger'
+
+    # Append-only: every change to a wallet balance writes one signed entry here
+    entry_id = db.Column(db.Integer, primary_key=True)
+    wallet_id = db.Column(db.Integer, db.ForeignKey('wallets.wallet_id'), nullable=False, index=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.transaction_id'), nullable=True, index=True)
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    entry_type = db.Column(db.String(20), nullable=False)  # opening, bonus, deposit, purchase, sale, rental, rental_income
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.entry_id} {self.entry_type} {self.amount_cents}>'
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+
+    # e.g. 'books.total', 'transactions.volume', 'transactions.count:2025-10-26'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+class RevenueRollup(db.Model):
+    __tablename__ = 'revenue_rollups'
+
+    # Transactions per UTC day, book category ('' for none) and type; kept by app/analytics.py
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    transaction_type = db.Column(db.String(20), primary_key=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_cents = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<RevenueRollup {self.day} {self.category} {self.transaction_type}>'
+
+class BookRevenueRollup(db.Model):
+    __tablename__ = 'book_revenue_rollups'
+
+    # Transactions per UTC day and book, for the top-books ranking (app/analytics.py)
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.book_id'), primary_key=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_cents = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<BookRevenueRollup {self.day} {self.book_id}>'
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    # The runner polls "queued and due" jobs in run_at order
+    __table_args__ = (db.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+
+    job_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # registered with @jobs.task
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.job_id} {self.name} {self.status}>'
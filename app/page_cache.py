@@ -0,0 +1,263 @@
+# app/page_cache.py
+"""Rendered-page cache for the public book pages.
+
+``@cached_page`` stores a view's rendered body under a key made of the
+endpoint, its view/query arguments and the visitor's role.  Only roles listed
+in PAGE_CACHE_ROLES are cached (anonymous by default: signed-in pages carry
+the user's name and balance).  Views tag what they show with ``tag()``; any
+committed change to a book invalidates exactly the ``book:<id>`` pages plus
+the ``catalog`` listing pages.
+
+PAGE_CACHE_BACKEND picks the store: ``memory`` (per process) or ``sqlite``
+(one file shared by every worker on the host).  Both are size-bounded LRU
+with a TTL as a safety net.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+import sqlalchemy as sa
+from flask import current_app, g, request, session
+from flask_login import current_user
+from app import db, db_routing, metrics
+from app.models import Book
+
+_PENDING = 'page_cache.pending'  # session.info: tags to drop once the transaction commits
+
+_counters = {'hits': 0, 'misses': 0, 'invalidations': 0}  # this process only
+
+
+class MemoryBackend:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, body, content_type, tags)
+        self._tags = {}  # tag -> set(keys)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, body, content_type, tags, ttl):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.time() + ttl, body, content_type, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            for tag in entry[3]:
+                self._tags.get(tag, set()).discard(key)
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.pop(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class SQLiteBackend:
+    """Cache shared by all workers through a local SQLite file (WAL)."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(
+                'CREATE TABLE IF NOT EXISTS page_cache (key TEXT PRIMARY KEY, body BLOB NOT NULL, '
+                '  content_type TEXT, expires REAL NOT NULL, accessed REAL NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS ix_page_cache_accessed ON page_cache (accessed);'
+                'CREATE TABLE IF NOT EXISTS page_cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, '
+                '  PRIMARY KEY (tag, key)) WITHOUT ROWID;'
+            )
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute('SELECT body, content_type, expires FROM page_cache WHERE key = ?',
+                                 (key,)).fetchone()
+        if row is None or row[2] < now:
+            return None
+        connection.execute('UPDATE page_cache SET accessed = ? WHERE key = ?', (now, key))
+        return bytes(row[0]), row[1]
+
+    def set(self, key, body, content_type, tags, ttl):
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('INSERT OR REPLACE INTO page_cache VALUES (?, ?, ?, ?, ?)',
+                               (key, body, content_type, now + ttl, now))
+            connection.execute('DELETE FROM page_cache_tags WHERE key = ?', (key,))
+            connection.executemany('INSERT OR IGNORE INTO page_cache_tags VALUES (?, ?)',
+                                   [(tag, key) for tag in tags])
+            excess = connection.execute('SELECT count(*) FROM page_cache').fetchone()[0] - self.max_entries
+            if excess > 0:
+                # Evict the least recently used tenth in one go rather than a row per insert
+                evict = max(excess, self.max_entries // 10)
+                connection.execute('DELETE FROM page_cache WHERE key IN '
+                                   '(SELECT key FROM page_cache ORDER BY accessed LIMIT ?)', (evict,))
+                connection.execute('DELETE FROM page_cache_tags WHERE key NOT IN (SELECT key FROM page_cache)')
+
+    def invalidate(self, tags):
+        tags = list(tags)
+        marks = ','.join('?' * len(tags))
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(f'DELETE FROM page_cache WHERE key IN '
+                               f'(SELECT key FROM page_cache_tags WHERE tag IN ({marks}))', tags)
+            connection.execute(f'DELETE FROM page_cache_tags WHERE tag IN ({marks})', tags)
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute('DELETE FROM page_cache')
+        connection.execute('DELETE FROM page_cache_tags')
+
+
+def _backend():
+    app = current_app._get_current_object()
+    if 'page_cache' not in app.extensions:
+        kind = app.config.get('PAGE_CACHE_BACKEND')
+        size = app.config.get('PAGE_CACHE_SIZE', 512)
+        if kind == 'memory':
+            backend = MemoryBackend(size)
+        elif kind == 'sqlite':
+            path = app.config.get('PAGE_CACHE_PATH') or os.path.join(app.instance_path, 'page_cache.db')
+            backend = SQLiteBackend(path, size)
+        elif not kind:
+            backend = None
+        else:
+            raise ValueError(f'Unknown PAGE_CACHE_BACKEND {kind!r}')
+        app.extensions['page_cache'] = backend
+    return app.extensions['page_cache']
+
+
+def _role():
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    return current_user.role or 'student'
+
+
+def tag(*tags):
+    """Record what the current page shows, for invalidation."""
+    g.setdefault('page_cache_tags', set()).update(tags)
+
+
+def cached_page(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        backend = _backend()
+        role = _role()
+        # Pending flash messages are rendered into the page, so those visits bypass the cache
+        if (backend is None or request.method != 'GET'
+                or role not in current_app.config.get('PAGE_CACHE_ROLES', ('anonymous',))
+                or '_flashes' in session):
+            return view(*args, **kwargs)
+
+        # With conditional.validated outside, the entry is only good for the rows its ETag names
+        key = '|'.join((request.endpoint, repr(sorted((request.view_args or {}).items())),
+                        repr(sorted(request.args.items(multi=True))), role, g.get('page_etag', '')))
+        hit = backend.get(key)
+        if hit is not None:
+            _counters['hits'] += 1
+            metrics.cache_lookup('page', True)
+            body, content_type = hit
+            response = current_app.response_class(body, content_type=content_type)
+            response.headers['X-Page-Cache'] = 'HIT'
+            return response
+
+        _counters['misses'] += 1
+        metrics.cache_lookup('page', False)
+        # The stored page is served to everyone for a while: render it from the primary
+        with db_routing.primary():
+            response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough and '_flashes' not in session:
+            backend.set(key, response.get_data(), response.content_type, g.get('page_cache_tags', set()),
+                        current_app.config.get('PAGE_CACHE_TTL', 300))
+            response.headers['X-Page-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def books_changed(book_ids, listing=True):
+    """Invalidate pages for these books once the current transaction commits.
+
+    ORM changes to Book are picked up automatically; bulk UPDATEs call this.
+    """
+    pending = db.session.info.setdefault(_PENDING, set())
+    pending.update(f'book:{book_id}' for book_id in book_ids)
+    if listing:
+        pending.add('catalog')
+
+
+def _track_flush(session, flush_context):
+    changed = [obj.book_id for obj in (*session.new, *session.dirty, *session.deleted)
+               if isinstance(obj, Book)]
+    if changed:
+        pending = session.info.setdefault(_PENDING, set())
+        pending.update(f'book:{book_id}' for book_id in changed)
+        pending.add('catalog')
+
+
+def _after_commit(session):
+    tags = session.info.pop(_PENDING, None)
+    if tags:
+        try:
+            backend = _backend()
+        except RuntimeError:  # no app context
+            return
+        if backend is not None:
+            backend.invalidate(tags)
+            _counters['invalidations'] += 1
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def stats():
+    """Hit/miss counters for monitoring."""
+    counters = dict(_counters, backend=current_app.config.get('PAGE_CACHE_BACKEND') or 'off')
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_rate'] = round(counters['hits'] / lookups * 100, 1) if lookups else 0.0
+    return counters
+
+
+def clear():
+    backend = _backend()
+    if backend is not None:
+        backend.clear()
+
+
+sa.event.listen(db.session, 'after_flush', _track_flush)
+sa.event.listen(db.session, 'after_commit', _after_commit)
+sa.event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,186 @@
+# app/pagination.py
+import base64
+import binascii
+import json
+import math
+import time
+from datetime import datetime
+import sqlalchemy as sa
+from flask import request, url_for
+from app import db
+
+COUNT_CACHE_TTL = 60  # seconds an approximate total is reused for
+_count_cache = {}
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode an opaque cursor token; anything malformed means "first page"."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def cached_count(query, ttl=COUNT_CACHE_TTL):
+    """COUNT(*) for a query, reused for ``ttl`` seconds per distinct statement.
+
+    Listings only need a rough "N records" figure, so we avoid paying a full
+    count on every page turn.
+    """
+    compiled = query.statement.compile(db.engine)
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    now = time.monotonic()
+    hit = _count_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    total = query.order_by(None).count()
+    if len(_count_cache) > 1024:
+        _count_cache.clear()
+    _count_cache[key] = (now + ttl, total)
+    return total
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing.
+
+    Exposes the attributes the templates already use on Flask-SQLAlchemy's
+    ``Pagination`` (items, page, pages, total, has_prev, has_next) plus opaque
+    ``prev_cursor``/``next_cursor`` tokens.
+    """
+
+    def __init__(self, items, per_page, page, total, prev_cursor, next_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.page = page
+        self.total = total
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def pages(self):
+        if not self.total:
+            return max(self.page, 1)
+        return max(math.ceil(self.total / self.per_page), self.page)
+
+    def _url(self, cursor):
+        args = request.args.to_dict()
+        args.pop('page', None)
+        args['cursor'] = cursor
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    @property
+    def prev_url(self):
+        return self._url(self.prev_cursor) if self.has_prev else None
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor) if self.has_next else None
+
+
+def _dump(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _load(value, column):
+    """A cursor key value back as the column's Python type; ValueError if it can't be one."""
+    if value is None:
+        return None
+    if isinstance(column.type, sa.DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, sa.Integer):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f'not an integer: {value!r}')
+        return value
+    if not isinstance(value, (str, int, float)):
+        raise ValueError(f'not a scalar: {value!r}')
+    return value
+
+
+def _load_key(key, order_by):
+    """Decoded key values for ``order_by``, or None when the cursor's key is missing or tampered with."""
+    if not isinstance(key, list) or len(key) != len(order_by):
+        return None
+    try:
+        return [_load(value, column) for value, column in zip(key, order_by)]
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+def keyset_paginate(query, order_by, cursor=None, per_page=20, with_total=True):
+    """Paginate ``query`` newest-first on ``order_by`` (e.g. created_at, primary key).
+
+    Each page is a single indexed range scan: ``WHERE (created_at, id) < (:c, :i)
+    ORDER BY created_at DESC, id DESC LIMIT n`` -- no OFFSET, so deep pages cost
+    the same as the first one.  The last column must be unique.
+    """
+    state = decode_cursor(cursor) or {}
+    key = state.get('k')
+    backwards = state.get('d') == 'prev'
+    page = state.get('p', 1) if isinstance(state.get('p'), int) else 1
+
+    base = query
+    values = _load_key(key, order_by)
+    if values is not None:
+        position = sa.tuple_(*order_by)
+        bound = sa.tuple_(*[sa.literal(value, column.type) for value, column in zip(values, order_by)])
+        query = query.filter(position > bound if backwards else position < bound)
+    else:
+        key, backwards, page = None, False, 1
+
+    ordering = [column.asc() if backwards else column.desc() for column in order_by]
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def token(row, direction, target):
+        return encode_cursor({
+            'k': [_dump(getattr(row, column.key)) for column in order_by],
+            'd': direction,
+            'p': target,
+        })
+
+    has_prev = (more if backwards else key is not None) and bool(rows)
+    has_next = (True if backwards else more) and bool(rows)
+    if not has_prev:
+        page = 1
+    prev_cursor = token(rows[0], 'prev', page - 1) if has_prev else None
+    next_cursor = token(rows[-1], 'next', page + 1) if has_next else None
+    total = cached_count(base) if with_total else None
+    return KeysetPage(rows, per_page, page, total, prev_cursor, next_cursor)
+
+
+def offset_paginate(query, cursor=None, per_page=20, with_total=True):
+    """Fallback for orderings that have no stable key (e.g. ranked search results).
+
+    Uses the same opaque cursors as ``keyset_paginate`` so templates don't care.
+    """
+    state = decode_cursor(cursor) or {}
+    offset = state.get('o', 0) if isinstance(state.get('o'), int) else 0
+    offset = max(offset, 0)
+    page = offset // per_page + 1
+    rows = query.limit(per_page + 1).offset(offset).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    prev_cursor = encode_cursor({'o': max(offset - per_page, 0)}) if offset else None
+    next_cursor = encode_cursor({'o': offset + per_page}) if more else None
+    total = cached_count(query) if with_total else None
+    return KeysetPage(rows, per_page, page, total, prev_cursor, next_cursor)
@@ -1,10 +1,12 @@
 # app/payments/routes.py
-from flask import render_template, url_for, flash, redirect, request, session
+from flask import render_template, url_for, flash, redirect, request, session, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
+import sqlalchemy as sa
 from app.payments.forms import AddFundsForm, CheckoutForm, RentalForm
-from app.models import Book, Transaction, Rental, Wallet
-from app import db
+from app.models import Book, Transaction, Rental
+from app import analytics, db, db_routing, queries, ledger, metrics, stats
+from app.pagination import keyset_paginate
 from app.payments import bp
 
 # app/payments/routes.py - Update wallet function
@@ -18,16 +20,12 @@ def wallet():
     
     form = AddFundsForm()
     
-    # Calculate total earnings from user's uploaded books
-    total_earnings = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.book_id.in_(
-            db.session.query(Book.book_id).filter_by(uploaded_by=current_user.user_id)
-        )
-    ).scalar() or 0.0
+    # Sales and rental income received, kept on the wallet row by app.ledger
+    total_earnings = current_user.wallet.earned if current_user.wallet else 0.0
     
     if form.validate_on_submit():
         # Add funds to wallet
-        current_user.wallet.add_funds(form.amount.data)
+        ledger.credit(current_user.user_id, ledger.to_cents(form.amount.data), 'deposit')
         db.session.commit()
         flash(f'${form.amount.data:.2f} has been added to your wallet!', 'success')
         return redirect(url_for('payments.wallet'))
@@ -47,25 +45,11 @@ def add_to_cart(book_id):
         return redirect(url_for('books.book_detail', book_id=book_id))
     
     book = Book.query.get_or_404(book_id)
-    
-    # Initialize cart in session if not exists
-    if 'cart' not in session:
-        session['cart'] = []
-    
-    # Check if book is already in cart
-    cart_item = {
-        'book_id': book.book_id,
-        'title': book.title,
-        'author': book.author,
-        'price': book.price,
-        'rental_fee': book.rental_fee,
-        'type': 'purchase'  # default to purchase
-    }
+    cart_ids = _cart_ids()
     
     # Add to cart if not already there
-    if not any(item['book_id'] == book_id for item in session['cart']):
-        session['cart'].append(cart_item)
-        session.modified = True
+    if book.book_id not in cart_ids:
+        session['cart'] = cart_ids + [book.book_id]
         flash(f'"{book.title}" has been added to your cart!', 'success')
     else:
         flash(f'"{book.title}" is already in your cart!', 'info')
@@ -80,9 +64,11 @@ def cart():
         flash('Admins cannot purchase or rent books.', 'warning')
         return redirect(url_for('admin.dashboard'))
     
-    cart_items = session.get('cart', [])
-    total = sum(item['price'] for item in cart_items if item['type'] == 'purchase')
-    return render_template('payments/cart.html', title='Shopping Cart', cart_items=cart_items, total=total)
+    lines, unavailable = _price_cart(_cart_ids())
+    total = sum(cents for _, cents in lines) / 100
+    return render_template('payments/cart.html', title='Shopping Cart',
+                           cart_items=[_cart_item(book) for book, _ in lines], total=total,
+                           unavailable=unavailable)
 
 @bp.route('/remove-from-cart/<int:book_id>')
 @login_required
@@ -93,12 +79,106 @@ def remove_from_cart(book_id):
         return redirect(url_for('admin.dashboard'))
     
     if 'cart' in session:
-        session['cart'] = [item for item in session['cart'] if item['book_id'] != book_id]
-        session.modified = True
+        session['cart'] = [cart_id for cart_id in _cart_ids() if cart_id != book_id]
         flash('Item removed from cart!', 'success')
     
     return redirect(url_for('payments.cart'))
 
+def _cart_ids():
+    """Book ids in the cart; the session stores nothing else about them."""
+    # Carts from before the server-side session held one dict per book
+    return [item['book_id'] if isinstance(item, dict) else item for item in session.get('cart', [])]
+
+def _cart_item(book):
+    return {'book_id': book.book_id, 'title': book.title, 'author': book.author,
+            'price': book.price, 'rental_fee': book.rental_fee, 'type': 'purchase'}
+
+def _price_cart(book_ids):
+    """Current price of every cart book from one batch query.
+
+    Returns (lines, unavailable) where lines are (book, cents) for books that
+    can still be bought and unavailable lists the titles that cannot.
+    """
+    books = {book.book_id: book for book in Book.query.filter(Book.book_id.in_(book_ids))}
+    lines, unavailable = [], []
+    for book_id in book_ids:
+        book = books.get(book_id)
+        if book is None or book.status != 'available' or book.uploaded_by == current_user.user_id:
+            unavailable.append(book.title if book else f'#{book_id}')
+            continue
+        lines.append((book, ledger.to_cents(book.price)))
+    return lines, unavailable
+
+def _settle_cart(lines):
+    """Buy every priced cart line in the current transaction (caller commits)."""
+    now = datetime.utcnow()
+    # Sellers must be read before the claim hands the books to the buyer
+    sellers = {book.book_id: book.uploaded_by for book, _ in lines}
+    ledger.claim_books([book.book_id for book, _ in lines], 'sold', new_owner_id=current_user.user_id)
+    
+    # One multi-row INSERT ... RETURNING; rows are matched back by book_id
+    rows = [{'user_id': current_user.user_id, 'book_id': book.book_id, 'amount': cents / 100,
+             'transaction_type': 'purchase', 'status': 'completed', 'created_at': now}
+            for book, cents in lines]
+    transaction_ids = dict((book_id, transaction_id) for transaction_id, book_id in db.session.execute(
+        sa.insert(Transaction).returning(Transaction.transaction_id, Transaction.book_id), rows))
+    stats.incr_transactions(rows)
+    analytics.record(rows)
+    for book, cents in lines:
+        metrics.transaction('purchase', cents)
+    
+    ledger.settle(current_user.user_id, [
+        (transaction_ids[book.book_id], sellers[book.book_id], cents, 'purchase', 'sale')
+        for book, cents in lines
+    ])
+
+@bp.route('/checkout', methods=['GET', 'POST'])
+@login_required
+def checkout():
+    # Prevent admins from checking out
+    if current_user.is_admin():
+        flash('Admins cannot purchase or rent books.', 'warning')
+        return redirect(url_for('admin.dashboard'))
+    
+    cart_ids = _cart_ids()
+    if not cart_ids:
+        flash('Your cart is empty.', 'info')
+        return redirect(url_for('payments.cart'))
+    
+    lines, unavailable = _price_cart(cart_ids)
+    total = sum(cents for _, cents in lines) / 100
+    form = CheckoutForm()
+    
+    if form.validate_on_submit():
+        if unavailable:
+            session['cart'] = [book.book_id for book, _ in lines]
+            flash(f'No longer available and removed from your cart: {", ".join(unavailable)}', 'warning')
+            return redirect(url_for('payments.cart'))
+        if form.payment_method.data != 'wallet':
+            flash('Only wallet payments are available at the moment.', 'warning')
+            return redirect(url_for('payments.checkout'))
+        
+        # The whole cart is one DB transaction with a single commit
+        try:
+            _settle_cart(lines)
+            db.session.commit()
+        except ledger.InsufficientFunds:
+            db.session.rollback()
+            flash('Insufficient funds in your wallet!', 'danger')
+            return redirect(url_for('payments.wallet'))
+        except ledger.BookUnavailable:
+            db.session.rollback()
+            flash('Sorry, some of these books were just taken. Please review your cart.', 'warning')
+            return redirect(url_for('payments.checkout'))
+        
+        session.pop('cart', None)
+        flash(f'Checkout complete: {len(lines)} item(s) for ${total:.2f}.', 'success')
+        return redirect(url_for('payments.transaction_history'))
+    
+    return render_template('payments/checkout.html', title='Checkout', form=form,
+                           cart_items=[_cart_item(book) for book, _ in lines], total=total,
+                           unavailable=unavailable)
+
 @bp.route('/rent/<int:book_id>', methods=['GET', 'POST'])
 @login_required
 def rent_book(book_id):
@@ -112,41 +192,41 @@ def rent_book(book_id):
     
     if form.validate_on_submit():
         rental_days = form.rental_days.data
-        total_cost = book.rental_fee * rental_days
+        cost_cents = ledger.to_cents(book.rental_fee) * rental_days
+        owner_id = book.uploaded_by
         
-        # Check if user has enough balance
-        if current_user.wallet.balance < total_cost:
+        # Everything below is one DB transaction with a single commit
+        try:
+            ledger.claim_book(book.book_id, 'rented')
+            
+            transaction = Transaction(
+                user_id=current_user.user_id,
+                book_id=book.book_id,
+                amount=cost_cents / 100,
+                transaction_type='rental',
+                status='completed'
+            )
+            db.session.add(transaction)
+            db.session.flush()
+            
+            db.session.add(Rental(
+                transaction_id=transaction.transaction_id,
+                start_date=datetime.utcnow(),
+                end_date=datetime.utcnow() + timedelta(days=rental_days)
+            ))
+            
+            # Deduct from user's wallet and add to book owner's wallet
+            ledger.transfer(current_user.user_id, owner_id, cost_cents,
+                            'rental', 'rental_income', transaction.transaction_id)
+            db.session.commit()
+        except ledger.InsufficientFunds:
+            db.session.rollback()
             flash('Insufficient funds in your wallet!', 'danger')
             return redirect(url_for('payments.wallet'))
-        
-        # Create transaction
-        transaction = Transaction(
-            user_id=current_user.user_id,
-            book_id=book.book_id,
-            amount=total_cost,
-            transaction_type='rental',
-            status='completed'
-        )
-        db.session.add(transaction)
-        db.session.commit()
-        
-        # Create rental record
-        rental = Rental(
-            transaction_id=transaction.transaction_id,
-            start_date=datetime.utcnow(),
-            end_date=datetime.utcnow() + timedelta(days=rental_days)
-        )
-        db.session.add(rental)
-        
-        # Deduct from user's wallet and add to book owner's wallet
-        current_user.wallet.deduct_funds(total_cost)
-        book_owner_wallet = Wallet.query.filter_by(user_id=book.uploaded_by).first()
-        book_owner_wallet.add_funds(total_cost)
-        
-        # Update book status
-        book.status = 'rented'
-        
-        db.session.commit()
+        except ledger.BookUnavailable:
+            db.session.rollback()
+            flash('Sorry, this book is no longer available.', 'warning')
+            return redirect(url_for('books.book_detail', book_id=book_id))
         
         flash(f'Book rented successfully for {rental_days} days!', 'success')
         return redirect(url_for('payments.transaction_history'))
@@ -154,6 +234,7 @@ def rent_book(book_id):
     return render_template('payments/rent.html', title='Rent Book', book=book, form=form)
 
 @bp.route('/purchase/<int:book_id>')
+@db_routing.use_primary
 @login_required
 def purchase_book(book_id):
     # Prevent admins from purchasing books
@@ -162,32 +243,36 @@ def purchase_book(book_id):
         return redirect(url_for('books.book_detail', book_id=book_id))
     
     book = Book.query.get_or_404(book_id)
+    price_cents = ledger.to_cents(book.price)
+    seller_id = book.uploaded_by
     
-    # Check if user has enough balance
-    if current_user.wallet.balance < book.price:
+    # Everything below is one DB transaction with a single commit
+    try:
+        # Mark sold and transfer ownership, only if still available
+        ledger.claim_book(book.book_id, 'sold', new_owner_id=current_user.user_id)
+        
+        transaction = Transaction(
+            user_id=current_user.user_id,
+            book_id=book.book_id,
+            amount=price_cents / 100,
+            transaction_type='purchase',
+            status='completed'
+        )
+        db.session.add(transaction)
+        db.session.flush()
+        
+        # Deduct from user's wallet and add to book owner's wallet
+        ledger.transfer(current_user.user_id, seller_id, price_cents,
+                        'purchase', 'sale', transaction.transaction_id)
+        db.session.commit()
+    except ledger.InsufficientFunds:
+        db.session.rollback()
         flash('Insufficient funds in your wallet!', 'danger')
         return redirect(url_for('payments.wallet'))
-    
-    # Create transaction
-    transaction = Transaction(
-        user_id=current_user.user_id,
-        book_id=book.book_id,
-        amount=book.price,
-        transaction_type='purchase',
-        status='completed'
-    )
-    db.session.add(transaction)
-    
-    # Deduct from user's wallet and add to book owner's wallet
-    current_user.wallet.deduct_funds(book.price)
-    book_owner_wallet = Wallet.query.filter_by(user_id=book.uploaded_by).first()
-    book_owner_wallet.add_funds(book.price)
-    
-    # Update book status
-    book.status = 'sold'
-    book.uploaded_by = current_user.user_id  # Transfer ownership
-    
-    db.session.commit()
+    except ledger.BookUnavailable:
+        db.session.rollback()
+        flash('Sorry, this book is no longer available.', 'warning')
+        return redirect(url_for('books.book_detail', book_id=book_id))
     
     flash('Book purchased successfully!', 'success')
     return redirect(url_for('payments.transaction_history'))
@@ -196,21 +281,23 @@ def purchase_book(book_id):
 @login_required
 def transaction_history():
     # Admins see all transactions, students see only their own
-    if current_user.is_admin():
-        transactions = Transaction.query.order_by(Transaction.created_at.desc()).all()
-    else:
-        transactions = Transaction.query.filter_by(user_id=current_user.user_id)\
-                                      .order_by(Transaction.created_at.desc())\
-                                      .all()
+    user_id = None if current_user.is_admin() else current_user.user_id
+    query = queries.transactions('transaction_history')
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    
+    transactions = keyset_paginate(query, (Transaction.created_at, Transaction.transaction_id),
+                                   request.args.get('cursor'),
+                                   per_page=current_app.config.get('TRANSACTION_HISTORY_PER_PAGE', 25),
+                                   with_total=False)
     
-    # Calculate statistics for the template
-    total_spent = sum(t.amount for t in transactions if t.amount > 0)
-    purchase_count = sum(1 for t in transactions if t.transaction_type == 'purchase')
-    rental_count = sum(1 for t in transactions if t.transaction_type == 'rental')
+    # Statistics come from one grouped aggregate instead of summing rows in Python
+    summary = queries.transaction_summary(user_id)
     
     return render_template('payments/transaction_history.html', 
                          title='Transaction History', 
                          transactions=transactions,
-                         total_spent=total_spent,
-                         purchase_count=purchase_count,
-                         rental_count=rental_count)
\ No newline at end of file
+                         total_spent=summary['total_spent'],
+                         operation_count=summary['operation_count'],
+                         purchase_count=summary['purchase_count'],
+                         rental_count=summary['rental_count'])
\ No newline at end of file
@@ -0,0 +1,156 @@
+# app/perf.py
+"""Per-request timing: wall time, SQL statements and time, template time.
+
+Each finished request is appended to a bounded ring buffer (this process
+only) that ``/admin/perf`` turns into per-endpoint percentiles.  Statements
+slower than PERF_SLOW_QUERY_MS are logged to ``app.perf`` from requests, jobs
+and CLI commands alike, and the last few are kept for the perf page.  Their
+bound parameters (password hashes, emails) are left out unless
+PERF_LOG_QUERY_PARAMS is set for debugging.
+"""
+import logging
+import threading
+import time
+from collections import deque
+import sqlalchemy as sa
+from flask import g, has_app_context, request, before_render_template, template_rendered
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_requests = deque(maxlen=5000)  # (endpoint, status, wall_ms, sql_count, sql_ms, template_ms)
+_slow_queries = deque(maxlen=50)  # (time, ms, statement, parameters)
+_slow_threshold = None  # ms, from PERF_SLOW_QUERY_MS
+_log_params = False  # PERF_LOG_QUERY_PARAMS
+
+
+class RequestTimer:
+    __slots__ = ('start', 'sql_count', 'sql_time', 'template_time', 'template_depth', 'template_start')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.template_start = 0.0
+
+
+def _timer():
+    return g.get('perf') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._perf_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._perf_start
+    timer = _timer()
+    if timer is not None:
+        timer.sql_count += 1
+        timer.sql_time += elapsed
+    threshold = _slow_threshold
+    if threshold is not None and elapsed * 1000 >= threshold:
+        params = repr(parameters) if _log_params else None
+        if params and len(params) > 500:
+            params = params[:500] + '...'
+        logger.warning('Slow query (%.1f ms): %s -- %s', elapsed * 1000, ' '.join(statement.split()),
+                       params or 'parameters not logged')
+        with _lock:
+            _slow_queries.append((time.time(), elapsed * 1000, statement, params))
+
+
+def _template_started(sender, template, context, **extra):
+    timer = _timer()
+    if timer is not None:
+        if timer.template_depth == 0:
+            timer.template_start = time.perf_counter()
+        timer.template_depth += 1
+
+
+def _template_finished(sender, template, context, **extra):
+    timer = _timer()
+    if timer is not None and timer.template_depth:
+        timer.template_depth -= 1
+        # render_template() called while rendering (e.g. from a macro) is already counted
+        if timer.template_depth == 0:
+            timer.template_time += time.perf_counter() - timer.template_start
+
+
+def _start_request():
+    g.perf = RequestTimer()
+
+
+def _finish_request(response):
+    timer = g.pop('perf', None)
+    if timer is not None:
+        wall = time.perf_counter() - timer.start
+        with _lock:
+            _requests.append((request.endpoint or 'unmatched', response.status_code, wall * 1000,
+                              timer.sql_count, timer.sql_time * 1000, timer.template_time * 1000))
+    return response
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(int(round(fraction * len(ordered))) - 1, 0))]
+
+
+def summary():
+    """Per-endpoint stats over the requests in the buffer, slowest p95 first."""
+    with _lock:
+        rows = list(_requests)
+    by_endpoint = {}
+    for row in rows:
+        by_endpoint.setdefault(row[0], []).append(row)
+    endpoints = []
+    for endpoint, samples in by_endpoint.items():
+        wall = sorted(sample[2] for sample in samples)
+        sql_ms = sorted(sample[4] for sample in samples)
+        template_ms = sorted(sample[5] for sample in samples)
+        endpoints.append({
+            'endpoint': endpoint,
+            'count': len(samples),
+            'errors': sum(1 for sample in samples if sample[1] >= 500),
+            'p50': percentile(wall, 0.50),
+            'p95': percentile(wall, 0.95),
+            'p99': percentile(wall, 0.99),
+            'max': wall[-1],
+            'queries': sum(sample[3] for sample in samples) / len(samples),
+            'sql_p95': percentile(sql_ms, 0.95),
+            'template_p95': percentile(template_ms, 0.95),
+        })
+    endpoints.sort(key=lambda item: item['p95'], reverse=True)
+    return endpoints, len(rows)
+
+
+def slow_queries():
+    with _lock:
+        return sorted(_slow_queries, key=lambda item: item[0], reverse=True)
+
+
+def init_app(app):
+    global _requests, _slow_threshold, _log_params
+    if not app.config.get('PERF_ENABLED', True):
+        return
+    size = app.config.get('PERF_BUFFER_SIZE', 5000)
+    if size != _requests.maxlen:
+        _requests = deque(_requests, maxlen=size)
+    _slow_threshold = app.config.get('PERF_SLOW_QUERY_MS')
+    _log_params = bool(app.config.get('PERF_LOG_QUERY_PARAMS'))
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        sa.event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        sa.event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    # Registered before the other modules' hooks, so the timer spans them too
+    # (after_request handlers run in reverse order)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
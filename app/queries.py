@@ -0,0 +1,79 @@
+# app/queries.py
+"""Named loader profiles for listing queries.
+
+Each profile lists the relationships a template renders per row, so they are
+fetched with the page (joined/select-in loading) instead of one lazy query per
+row.  Routes pick the profile that matches what their template touches.
+"""
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Book, Rental, Transaction
+
+PROFILES = {
+    # admin/transactions.html: user.username/email, book.title/author
+    'transaction_list': lambda: (joinedload(Transaction.user), joinedload(Transaction.book)),
+    # admin/dashboard.html: user.username
+    'transaction_feed': lambda: (joinedload(Transaction.user),),
+    # dashboard.html, payments/transaction_history.html: book.title/author
+    'transaction_history': lambda: (joinedload(Transaction.book),),
+    # admin/books.html, books/book_detail.html: uploader.username
+    'book_list': lambda: (joinedload(Book.uploader),),
+    # rental listings: transaction.book and transaction.user
+    'rental_list': lambda: (
+        joinedload(Rental.transaction).joinedload(Transaction.book),
+        joinedload(Rental.transaction).joinedload(Transaction.user),
+    ),
+}
+
+
+def with_profile(query, *profiles):
+    """Apply the loader options of one or more named profiles to a query."""
+    for name in profiles:
+        query = query.options(*PROFILES[name]())
+    return query
+
+
+def transactions(profile='transaction_list'):
+    return with_profile(Transaction.query, profile)
+
+
+def books(profile='book_list'):
+    return with_profile(Book.query, profile)
+
+
+def rentals(profile='rental_list'):
+    return with_profile(Rental.query, profile)
+
+
+def recent_transactions(limit, user_id=None, profile='transaction_list'):
+    query = transactions(profile)
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    return query.order_by(Transaction.created_at.desc()).limit(limit).all()
+
+
+def book_counts(user_ids):
+    """Books uploaded per user for a page of users, in one grouped query."""
+    if not user_ids:
+        return {}
+    rows = db.session.query(Book.uploaded_by, db.func.count(Book.book_id))\
+                     .filter(Book.uploaded_by.in_(user_ids))\
+                     .group_by(Book.uploaded_by).all()
+    return dict(rows)
+
+
+def transaction_summary(user_id=None):
+    """Spend and per-type counts in one grouped aggregate (no rows loaded)."""
+    query = db.session.query(
+        Transaction.transaction_type,
+        db.func.count(Transaction.transaction_id),
+        db.func.sum(db.case((Transaction.amount > 0, Transaction.amount), else_=0.0)),
+    )
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    summary = {'total_spent': 0.0, 'operation_count': 0, 'purchase_count': 0, 'rental_count': 0}
+    for transaction_type, count, spent in query.group_by(Transaction.transaction_type):
+        summary['total_spent'] += spent or 0.0
+        summary['operation_count'] += count
+        summary[f'{transaction_type}_count'] = count
+    return summary
@@ -0,0 +1,93 @@
+# app/rentals.py
+from datetime import datetime
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+from app import db, jobs, page_cache, stats
+from app.models import Book, Rental, Transaction
+
+DEFAULT_BATCH = 1000
+
+
+def _due(now):
+    return sa.and_(Rental.is_active == True, Rental.end_date <= now)  # noqa: E712
+
+
+def due_count(now=None):
+    return db.session.query(db.func.count(Rental.rental_id)).filter(_due(now or datetime.utcnow())).scalar()
+
+
+def expire(now=None, batch_size=DEFAULT_BATCH):
+    """Close every rental whose end_date has passed and put its book back on the shelf.
+
+    Works through the (is_active, end_date) index one batch at a time with two
+    bulk UPDATEs and a commit per batch, so memory and lock time stay flat no
+    matter how many rentals are due.  Returns (rentals closed, books restored).
+    """
+    now = now or datetime.utcnow()
+    closed = restored = 0
+    while True:
+        rows = db.session.execute(
+            sa.select(Rental.rental_id, Transaction.book_id)
+              .join(Transaction, Rental.transaction_id == Transaction.transaction_id)
+              .where(_due(now))
+              .order_by(Rental.end_date)
+              .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        rental_ids = [rental_id for rental_id, _ in rows]
+        book_ids = sorted({book_id for _, book_id in rows})
+
+        result = db.session.execute(
+            sa.update(Rental)
+              .where(Rental.rental_id.in_(rental_ids), Rental.is_active == True)  # noqa: E712
+              .values(is_active=False)
+              .execution_options(synchronize_session=False)
+        )
+        closed += result.rowcount
+        result = db.session.execute(
+            sa.update(Book)
+              .where(Book.book_id.in_(book_ids), Book.status == 'rented')
+              .values(status='available', updated_at=now)
+              .execution_options(synchronize_session=False)
+        )
+        restored += result.rowcount
+        # Bulk UPDATEs bypass the flush hooks that maintain the counters and the page cache
+        stats.incr({'books.available': result.rowcount})
+        if result.rowcount:
+            page_cache.books_changed(book_ids)
+        db.session.commit()
+        if len(rows) < batch_size:
+            break
+    return closed, restored
+
+
+@jobs.task('rentals.expire')
+def expire_job():
+    closed, restored = expire(batch_size=current_app.config.get('RENTAL_SWEEP_BATCH', DEFAULT_BATCH))
+    if closed:
+        current_app.logger.info('Expired %s rentals, %s books back in the catalog', closed, restored)
+
+
+rentals_cli = AppGroup('rentals', help='Rental maintenance.')
+
+
+@rentals_cli.command('sweep')
+@click.option('--batch-size', type=int, default=DEFAULT_BATCH, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Only count the rentals that would be closed.')
+def sweep_command(batch_size, dry_run):
+    """Close expired rentals and make their books available again."""
+    if dry_run:
+        click.echo(f'{due_count()} rentals are due to be closed.')
+        return
+    closed, restored = expire(batch_size=batch_size)
+    click.echo(f'Closed {closed} rentals; {restored} books are available again.')
+
+
+def init_app(app):
+    app.cli.add_command(rentals_cli)
+    interval = app.config.get('RENTAL_SWEEP_INTERVAL')
+    if interval:
+        jobs.periodic('rentals.expire', interval)
@@ -1,8 +1,8 @@
 # app/routes.py
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from app.models import Book, Transaction, Wallet, User
-from app import db
+from app import db, ledger, queries
 
 bp = Blueprint('main', __name__)
 
@@ -16,18 +16,18 @@ def index():
 def dashboard():
     # If admin tries to access student dashboard, redirect to admin dashboard
     if current_user.role == 'admin':  # Direct role check
-        print(f"Admin user {current_user.username} accessed student dashboard, redirecting...")
         return redirect(url_for('admin.dashboard'))
     
     # Get student-specific data for the dashboard
     user_books = Book.query.filter_by(uploaded_by=current_user.user_id).all()
-    user_transactions = Transaction.query.filter_by(user_id=current_user.user_id).order_by(Transaction.created_at.desc()).limit(10).all()
+    user_transactions = queries.recent_transactions(current_app.config.get('DASHBOARD_RECENT_TRANSACTIONS', 10),
+                                                    user_id=current_user.user_id,
+                                                    profile='transaction_history')
     
-    # Ensure wallet exists and get it
+    # Ensure wallet exists and get it (login queues the same idempotent insert)
     wallet = current_user.wallet
     if not wallet:
-        wallet = Wallet(user_id=current_user.user_id, balance=0.00)
-        db.session.add(wallet)
+        ledger.ensure_wallet(current_user.user_id)
         db.session.commit()
         # Refresh to get the wallet without reassigning current_user
         wallet = Wallet.query.filter_by(user_id=current_user.user_id).first()
@@ -0,0 +1,162 @@
+# app/search.py
+import re
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+from app import db
+from app.models import Book
+
+FTS_TABLE = 'books_fts'
+FTS_COLUMNS = ('title', 'author', 'description', 'isbn', 'category')
+
+# External-content FTS5 table: the index lives in books_fts, the text stays in books.
+# prefix='2 3' builds extra prefix indexes so "calc*" style queries stay cheap.
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {', '.join(FTS_COLUMNS)},
+        content='books', content_rowid='book_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    # Triggers keep the index in sync with every write to books (upload, edit,
+    # purchase, rental, delete, bulk updates) without touching the routes.
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)})
+        VALUES (new.book_id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})
+        VALUES ('delete', old.book_id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})
+        VALUES ('delete', old.book_id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+        INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)})
+        VALUES (new.book_id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+    END""",
+]
+
+FTS_DROP = [
+    'DROP TRIGGER IF EXISTS books_fts_au',
+    'DROP TRIGGER IF EXISTS books_fts_ad',
+    'DROP TRIGGER IF EXISTS books_fts_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+books_fts = sa.table(FTS_TABLE, sa.column('rowid'), sa.column('rank'))
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_support = {}
+
+
+def _has_fts5(connection):
+    if connection.dialect.name != 'sqlite':
+        return False
+    key = connection.engine.url.render_as_string()
+    if key not in _fts_support:
+        options = connection.exec_driver_sql('PRAGMA compile_options').scalars().all()
+        _fts_support[key] = 'ENABLE_FTS5' in options
+    return _fts_support[key]
+
+
+def fts_enabled(connection=None):
+    """True when the bound database has a usable books_fts index."""
+    connection = connection or db.session.connection()
+    if not _has_fts5(connection):
+        return False
+    return connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first() is not None
+
+
+def create_index(connection, rebuild=True):
+    """Create the FTS table and sync triggers. Returns False on backends without FTS5."""
+    if not _has_fts5(connection):
+        return False
+    for statement in FTS_DDL:
+        connection.exec_driver_sql(statement)
+    if rebuild:
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def drop_index(connection):
+    if connection.dialect.name == 'sqlite':
+        for statement in FTS_DROP:
+            connection.exec_driver_sql(statement)
+
+
+def match_expression(term, columns=None):
+    """Turn free text into an FTS5 MATCH string with prefix matching on every word.
+
+    User input is reduced to word tokens and quoted, so FTS operators typed
+    into the search box can't produce syntax errors.
+    """
+    tokens = _TOKEN_RE.findall(term or '')
+    if not tokens:
+        return None
+    expression = ' '.join(f'"{token}"*' for token in tokens)
+    if columns:
+        expression = '{%s} : (%s)' % (' '.join(columns), expression)
+    return expression
+
+
+def _like_filter(term, columns):
+    clauses = []
+    for token in _TOKEN_RE.findall(term or ''):
+        pattern = f'%{token}%'
+        clauses.append(sa.or_(*[getattr(Book, column).ilike(pattern) for column in columns]))
+    return sa.and_(*clauses) if clauses else None
+
+
+def search_books(query, term, columns=None, ranked=True):
+    """Filter a Book query by a search term.
+
+    Uses the FTS5 index (ranked by bm25, prefix matching) when available and
+    falls back to per-word ILIKE matching on other backends.
+    """
+    columns = columns or FTS_COLUMNS
+    if fts_enabled():
+        expression = match_expression(term, columns)
+        if expression is None:
+            return query
+        match = sa.text(f'{FTS_TABLE} MATCH :fts_query').bindparams(fts_query=expression)
+        if not ranked:
+            # Semi-join keeps the caller's ordering and can be applied more than once.
+            return query.filter(Book.book_id.in_(sa.select(books_fts.c.rowid).where(match)))
+        # ``rowid + 0`` keeps books_fts the outer loop: given a plain rowid join, the
+        # planner drives COUNT(*) (no ORDER BY rank) from books and runs MATCH per row
+        return query.join(books_fts, Book.book_id == books_fts.c.rowid + 0)\
+                    .filter(match)\
+                    .order_by(books_fts.c.rank)
+
+    condition = _like_filter(term, columns)
+    return query.filter(condition) if condition is not None else query
+
+
+search_cli = AppGroup('search', help='Manage the book full-text search index.')
+
+
+@search_cli.command('reindex')
+def reindex_command():
+    """Create the books_fts index if needed and rebuild it from the books table."""
+    with db.engine.begin() as connection:
+        if not create_index(connection):
+            click.echo(f'{connection.dialect.name} has no FTS5 support; search uses LIKE matching.')
+            return
+        count = connection.exec_driver_sql('SELECT count(*) FROM books').scalar()
+    click.echo(f'Indexed {count} books.')
+
+
+def init_app(app):
+    app.cli.add_command(search_cli)
+
+
+# Keep db.create_all()/drop_all() (tests, fresh installs) in step with the migration.
+@sa.event.listens_for(Book.__table__, 'after_create')
+def _create_index_with_table(target, connection, **kw):
+    create_index(connection, rebuild=False)
+
+
+@sa.event.listens_for(Book.__table__, 'after_drop')
+def _drop_index_with_table(target, connection, **kw):
+    drop_index(connection)
@@ -0,0 +1,242 @@
+# app/sessions.py
+"""Server-side sessions.
+
+Flask's default session serialises the whole session into a signed cookie,
+so every response re-sends (and every request re-verifies) all of it.  With
+SESSION_BACKEND set to ``sqlite`` or ``filesystem`` the cookie carries only a
+signed random session id; the data lives in a local store as compact tagged
+JSON (zlib-compressed when large).  Stores are pluggable: anything with
+``load`` (returning ``(blob, expires)`` or None)/``save``/``delete``/``purge``
+works.
+
+Stored sessions expire PERMANENT_SESSION_LIFETIME after they were last used,
+permanent or not: a request that changes nothing still pushes the expiry out
+once it is SESSION_TOUCH_INTERVAL old, so an active user is never logged out.
+
+``cookie`` keeps Flask's built-in behaviour.
+"""
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from flask import current_app, session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in, user_logged_out
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+from app import jobs
+
+_serializer = TaggedJSONSerializer()
+COMPRESS_OVER = 512  # bytes
+
+
+def dumps(data):
+    raw = _serializer.dumps(data).encode()
+    if len(raw) > COMPRESS_OVER:
+        return b'z' + zlib.compress(raw)
+    return b'j' + raw
+
+
+def loads(blob):
+    blob = bytes(blob)
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+    return _serializer.loads(raw.decode())
+
+
+class SQLiteSessionStore:
+    """Sessions in a local SQLite file, one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS sessions '
+                               '(sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def load(self, sid):
+        row = self._connection().execute('SELECT data, expires FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def save(self, sid, blob, expires):
+        self._connection().execute('INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+                                   (sid, blob, expires))
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def purge(self):
+        return self._connection().execute('DELETE FROM sessions WHERE expires < ?', (time.time(),)).rowcount
+
+
+class FileSessionStore:
+    """One file per session under ``directory``, sharded by id prefix."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid[:2], sid)
+
+    def load(self, sid):
+        try:
+            with open(self._path(sid), 'rb') as handle:
+                expires = float(handle.readline())
+                blob = handle.read()
+        except (OSError, ValueError):
+            return None
+        return (blob, expires) if expires >= time.time() else None
+
+    def save(self, sid, blob, expires):
+        path = self._path(sid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as out:
+            out.write(f'{expires}\n'.encode() + blob)
+        os.replace(temp_path, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def purge(self):
+        removed, now = 0, time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    with open(path, 'rb') as handle:
+                        expired = float(handle.readline()) < now
+                except (OSError, ValueError):
+                    continue
+                if expired:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires  # as stored, None until saved
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh id (e.g. on login) so an old cookie can't be reused."""
+        if not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        token = request.cookies.get(self.get_cookie_name(app))
+        if token:
+            try:
+                sid = self._signer(app).unsign(token).decode()
+            except BadSignature:
+                sid = None
+            stored = self.store.load(sid) if sid else None
+            if stored is not None:
+                blob, expires = stored
+                return ServerSession(loads(blob), sid=sid, expires=expires)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain, path = self.get_cookie_domain(app), self.get_cookie_path(app)
+        secure, samesite = self.get_cookie_secure(app), self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        refresh = session.permanent and app.config['SESSION_REFRESH_EACH_REQUEST']
+        expires = time.time() + app.permanent_session_lifetime.total_seconds()
+        # Use keeps any session alive; unchanged ones are rewritten at most once per interval
+        touch = session.expires is not None and \
+            expires - session.expires >= app.config.get('SESSION_TOUCH_INTERVAL', 3600)
+        if session.modified or refresh or touch:
+            self.store.save(session.sid, dumps(dict(session)), expires)
+        # The cookie only changes when the id does (or its expiry must be pushed out)
+        if session.new or refresh:
+            response.set_cookie(name, self._signer(app).sign(session.sid).decode(),
+                                expires=self.get_expiration_time(app, session), httponly=httponly,
+                                domain=domain, path=path, secure=secure, samesite=samesite)
+            response.vary.add('Cookie')
+
+
+def _store(app):
+    backend = app.config.get('SESSION_BACKEND', 'cookie')
+    path = app.config.get('SESSION_STORE_PATH') or os.path.join(app.instance_path, 'sessions')
+    if backend == 'sqlite':
+        return SQLiteSessionStore(path if path.endswith('.db') else path + '.db')
+    if backend == 'filesystem':
+        return FileSessionStore(path)
+    if backend == 'cookie':
+        return None
+    raise ValueError(f'Unknown SESSION_BACKEND {backend!r}')
+
+
+def _rotate(sender, user=None, **extra):
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+
+@jobs.task('sessions.purge')
+def purge_job():
+    interface = current_app.session_interface
+    if isinstance(interface, ServerSessionInterface):
+        removed = interface.store.purge()
+        if removed:
+            current_app.logger.info('Purged %s expired sessions', removed)
+
+
+def init_app(app):
+    store = _store(app)
+    if store is None:
+        return
+    app.session_interface = ServerSessionInterface(store)
+    user_logged_in.connect(_rotate, app)
+    user_logged_out.connect(_rotate, app)
+    jobs.periodic('sessions.purge', app.config.get('SESSION_PURGE_INTERVAL', 3600))
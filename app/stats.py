@@ -0,0 +1,260 @@
+# app/stats.py
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import click
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from flask import current_app
+from flask.cli import AppGroup
+from app import db, jobs
+from app.models import User, Book, Transaction, StatCounter
+
+RECONCILED_AT = 'stats.reconciled_at'
+
+
+def daily(name, day):
+    return f'{name}:{day.isoformat()}'
+
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def _apply(connection, deltas):
+    """Add each delta to its counter with one upsert per counter."""
+    table = StatCounter.__table__
+    now = datetime.utcnow()
+    upsert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(connection.dialect.name)
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        if upsert is not None:
+            statement = upsert(table).values(name=name, value=delta, updated_at=now)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={'value': table.c.value + statement.excluded.value, 'updated_at': now},
+            )
+            connection.execute(statement)
+            continue
+        result = connection.execute(
+            table.update().where(table.c.name == name)
+                 .values(value=table.c.value + delta, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(name=name, value=delta, updated_at=now))
+
+
+def incr(deltas, connection=None):
+    """Apply counter deltas inside the caller's transaction.
+
+    For writes that bypass the ORM (bulk inserts/updates); ORM flushes are
+    tracked automatically by ``_track_flush``.
+    """
+    _apply(connection or db.session.connection(), deltas)
+
+
+def incr_transactions(rows):
+    """Count transactions written with a bulk INSERT (given as column dicts)."""
+    deltas = defaultdict(float)
+    for row in rows:
+        _transaction_deltas(deltas, SimpleNamespace(**row), 1)
+    incr(deltas)
+
+
+def incr_books(rows):
+    """Count books written with a bulk INSERT (given as column dicts)."""
+    deltas = defaultdict(float)
+    for row in rows:
+        _book_deltas(deltas, SimpleNamespace(**row), 1)
+    incr(deltas)
+
+
+def _changed(obj, attr):
+    history = sa.inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _user_deltas(deltas, user, sign):
+    deltas['users.total'] += sign
+    if user.is_active is not False:
+        deltas['users.active'] += sign
+    if sign > 0:
+        deltas[daily('users.new', _day(user.created_at))] += 1
+
+
+def _book_deltas(deltas, book, sign):
+    deltas['books.total'] += sign
+    if (book.status or 'available') == 'available':
+        deltas['books.available'] += sign
+    if sign > 0:
+        deltas[daily('books.new', _day(book.created_at))] += 1
+
+
+def _transaction_deltas(deltas, transaction, sign):
+    day = _day(transaction.created_at)
+    amount = (transaction.amount or 0.0) * sign
+    deltas['transactions.total'] += sign
+    deltas[f'transactions.{transaction.transaction_type}'] += sign
+    deltas['transactions.volume'] += amount
+    deltas[daily('transactions.count', day)] += sign
+    deltas[daily('transactions.volume', day)] += amount
+    if (transaction.status or 'completed') == 'completed':
+        deltas['transactions.completed'] += sign
+
+
+def _track_flush(session, flush_context):
+    deltas = defaultdict(float)
+    for sign, objects in ((1, session.new), (-1, session.deleted)):
+        for obj in objects:
+            if isinstance(obj, User):
+                _user_deltas(deltas, obj, sign)
+            elif isinstance(obj, Book):
+                _book_deltas(deltas, obj, sign)
+            elif isinstance(obj, Transaction):
+                _transaction_deltas(deltas, obj, sign)
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            change = _changed(obj, 'is_active')
+            if change and (change[0] is not False) != (change[1] is not False):
+                deltas['users.active'] += 1 if change[1] is not False else -1
+        elif isinstance(obj, Book):
+            change = _changed(obj, 'status')
+            if change and (change[0] == 'available') != (change[1] == 'available'):
+                deltas['books.available'] += 1 if change[1] == 'available' else -1
+        elif isinstance(obj, Transaction):
+            change = _changed(obj, 'status')
+            if change and (change[0] == 'completed') != (change[1] == 'completed'):
+                deltas['transactions.completed'] += 1 if change[1] == 'completed' else -1
+
+    if deltas:
+        _apply(session.connection(), deltas)
+
+
+def reconcile(connection=None):
+    """Recompute every counter from the source tables and replace the stored values."""
+    connection = connection or db.session.connection()
+    users, books, transactions = User.__table__, Book.__table__, Transaction.__table__
+    count = sa.func.count()
+    values = {}
+
+    row = connection.execute(sa.select(
+        count, sa.func.sum(sa.case((users.c.is_active.is_not(False), 1), else_=0))
+    )).one()
+    values['users.total'], values['users.active'] = row[0], row[1] or 0
+
+    row = connection.execute(sa.select(
+        count, sa.func.sum(sa.case((sa.func.coalesce(books.c.status, 'available') == 'available', 1), else_=0))
+    )).one()
+    values['books.total'], values['books.available'] = row[0], row[1] or 0
+
+    row = connection.execute(sa.select(
+        count,
+        sa.func.coalesce(sa.func.sum(transactions.c.amount), 0.0),
+        sa.func.sum(sa.case((sa.func.coalesce(transactions.c.status, 'completed') == 'completed', 1), else_=0)),
+    )).one()
+    values['transactions.total'], values['transactions.volume'] = row[0], row[1]
+    values['transactions.completed'] = row[2] or 0
+
+    for kind, n in connection.execute(
+            sa.select(transactions.c.transaction_type, count).group_by(transactions.c.transaction_type)):
+        values[f'transactions.{kind}'] = n
+
+    day = sa.func.date(users.c.created_at)
+    for d, n in connection.execute(sa.select(day, count).group_by(day)):
+        if d:
+            values[f'users.new:{d}'] = n
+    day = sa.func.date(books.c.created_at)
+    for d, n in connection.execute(sa.select(day, count).group_by(day)):
+        if d:
+            values[f'books.new:{d}'] = n
+    day = sa.func.date(transactions.c.created_at)
+    for d, n, volume in connection.execute(
+            sa.select(day, count, sa.func.sum(transactions.c.amount)).group_by(day)):
+        if d:
+            values[f'transactions.count:{d}'] = n
+            values[f'transactions.volume:{d}'] = volume or 0.0
+
+    now = datetime.utcnow()
+    values[RECONCILED_AT] = now.timestamp()
+    table = StatCounter.__table__
+    connection.execute(table.delete())
+    connection.execute(table.insert(), [
+        {'name': name, 'value': float(value), 'updated_at': now} for name, value in values.items()
+    ])
+    return values
+
+
+def get_counters(*names):
+    """Fetch counters by name in one primary-key lookup; missing counters read as 0."""
+    rows = db.session.query(StatCounter.name, StatCounter.value)\
+                     .filter(StatCounter.name.in_(names + (RECONCILED_AT,))).all()
+    values = dict(rows)
+    if RECONCILED_AT not in values:
+        # First read after install/migration: seed the table from history once.
+        values = reconcile()
+        db.session.commit()
+    return {name: values.get(name, 0) for name in names}
+
+
+def dashboard_stats():
+    today = datetime.utcnow().date()
+    yesterday = today - timedelta(days=1)
+    counters = get_counters(
+        'users.total', 'users.active', daily('users.new', today),
+        'books.total', 'books.available', daily('books.new', today),
+        'transactions.total', 'transactions.completed', daily('transactions.count', today),
+        'transactions.volume', daily('transactions.volume', today), daily('transactions.volume', yesterday),
+    )
+    revenue_today = counters[daily('transactions.volume', today)]
+    revenue_yesterday = counters[daily('transactions.volume', yesterday)]
+    growth = round((revenue_today - revenue_yesterday) / revenue_yesterday * 100, 1) if revenue_yesterday else 0
+    return {
+        'total_users': int(counters['users.total']),
+        'active_users': int(counters['users.active']),
+        'new_users_today': int(counters[daily('users.new', today)]),
+        'total_books': int(counters['books.total']),
+        'available_books': int(counters['books.available']),
+        'books_uploaded_today': int(counters[daily('books.new', today)]),
+        'total_transactions': int(counters['transactions.total']),
+        'completed_transactions': int(counters['transactions.completed']),
+        'transactions_today': int(counters[daily('transactions.count', today)]),
+        'total_revenue': counters['transactions.volume'],
+        'revenue_today': revenue_today,
+        'revenue_growth': growth,
+    }
+
+
+stats_cli = AppGroup('stats', help='Maintain the precomputed dashboard counters.')
+
+
+@stats_cli.command('reconcile')
+def reconcile_command():
+    """Rebuild all counters from the users, books and transactions tables.
+
+    The ``stats.reconcile`` job does the same every STATS_RECONCILE_INTERVAL.
+    """
+    values = reconcile()
+    db.session.commit()
+    click.echo(f'Reconciled {len(values)} counters.')
+
+
+@jobs.task('stats.reconcile')
+def reconcile_job():
+    values = reconcile()
+    current_app.logger.info('Reconciled %s counters', len(values))
+
+
+def init_app(app):
+    app.cli.add_command(stats_cli)
+    interval = app.config.get('STATS_RECONCILE_INTERVAL')
+    if interval:
+        jobs.periodic('stats.reconcile', interval)
+
+
+sa.event.listen(db.session, 'after_flush', _track_flush)
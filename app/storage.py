@@ -0,0 +1,195 @@
+# app/storage.py
+"""Content-addressed storage for uploaded book files.
+
+Uploads are streamed to a temp file in fixed-size chunks while their SHA-256
+is computed, then moved to ``<UPLOAD_FOLDER>/<h[:2]>/<h[2:4]>/<h>.pdf``.  The
+same bytes always land on the same path, so a duplicate upload just points
+another ``Book.file_path`` at the existing file.  Books sharing a file are the
+reference count: the file is removed when the last one is deleted.
+
+``UPLOAD_FOLDER`` is outside app/static, so files are only reachable through
+``books.download``.  Rows written before that hold app/static paths
+(``uploads/books/...``, or an absolute path to the flat uploads folder);
+``normalize`` reads them as paths in the store, and ``flask storage migrate``
+moves their files over and rewrites the rows.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db, jobs, metrics
+from app.models import Book
+
+CHUNK_SIZE = 64 * 1024
+_HASHED = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+_LEGACY_PREFIX = 'uploads/books/'  # where the store used to sit under app/static
+
+
+def _root():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def _relative(path):
+    """Path as stored in Book.file_path: relative to UPLOAD_FOLDER, forward slashes."""
+    return os.path.relpath(path, _root()).replace(os.sep, '/')
+
+
+def normalize(file_path):
+    """A Book.file_path as a path relative to UPLOAD_FOLDER, reading older app/static forms."""
+    path = file_path.replace('\\', '/')
+    if path.startswith(_LEGACY_PREFIX):
+        return path[len(_LEGACY_PREFIX):]
+    if path.startswith('/') or re.match(r'^[A-Za-z]:/', path):
+        # Older rows stored an absolute path to the flat uploads folder
+        return path.split('/')[-1]
+    return path
+
+
+def _absolute(file_path, root=None):
+    """Absolute path of a stored file, or None if it would fall outside the store."""
+    root = os.path.abspath(root or _root())
+    path = os.path.normpath(os.path.join(root, *normalize(file_path).split('/')))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def save(file_storage, extension='pdf'):
+    """Stream an uploaded file into the store and return its Book.file_path.
+
+    Memory use is one chunk regardless of file size.
+    """
+    root = _root()
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    # Same directory as the final path so the move below is an atomic rename
+    handle, temp_path = tempfile.mkstemp(dir=root, suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        sha = digest.hexdigest()
+        target_dir = os.path.join(root, sha[:2], sha[2:4])
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, f'{sha}.{extension}')
+        # Replacing an identical file is harmless and also restores it if a
+        # concurrent release() removed it just before this upload commits.
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    metrics.upload(size)
+    return _relative(target)
+
+
+def references(file_path):
+    return db.session.query(db.func.count(Book.book_id)).filter(Book.file_path == file_path).scalar()
+
+
+def release(file_path):
+    """Delete a stored file once no book references it (run after the delete commits).
+
+    Files saved before content addressing are left alone.
+    """
+    if not file_path or not _HASHED.search(file_path):
+        return False
+    if references(file_path):
+        return False
+    path = _absolute(file_path)
+    if path and os.path.exists(path):
+        os.remove(path)
+    return True
+
+
+@jobs.task('storage.release')
+def release_job(file_path):
+    release(file_path)
+
+
+def path_for(book):
+    """Absolute path of a book's file on disk, or None."""
+    return _absolute(book.file_path) if book.file_path else None
+
+
+_digests = {}
+
+
+def content_hash(path):
+    """SHA-256 of a stored file, used as its strong ETag.
+
+    Content-addressed files carry it in their name; older files are hashed once
+    and remembered until their size or mtime changes.
+    """
+    if _HASHED.search(path.replace(os.sep, '/')):
+        return os.path.basename(path).split('.')[0]
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        if len(_digests) > 1024:
+            _digests.clear()
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def migrate(dry_run=False):
+    """Move files referenced from the old app/static store into UPLOAD_FOLDER.
+
+    Rewrites each Book.file_path to its form relative to UPLOAD_FOLDER.  Returns
+    (files moved, rows rewritten, files missing); caller commits.
+    """
+    legacy_root = os.path.join(current_app.static_folder, *_LEGACY_PREFIX.strip('/').split('/'))
+    moved = rewritten = missing = 0
+    stored = db.session.query(Book.file_path).filter(Book.file_path.isnot(None)).distinct()
+    for (file_path,) in stored.all():
+        relative = normalize(file_path)
+        target, source = _absolute(relative), _absolute(relative, legacy_root)
+        if target is None:
+            missing += 1
+            continue
+        if not os.path.exists(target):
+            if source is None or not os.path.exists(source):
+                missing += 1
+                continue
+            if not dry_run:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(source, target)
+            moved += 1
+        if relative != file_path:
+            if not dry_run:
+                db.session.query(Book).filter(Book.file_path == file_path)\
+                    .update({Book.file_path: relative}, synchronize_session=False)
+            rewritten += 1
+    return moved, rewritten, missing
+
+
+storage_cli = AppGroup('storage', help='Maintain the book file store.')
+
+
+@storage_cli.command('migrate')
+@click.option('--dry-run', is_flag=True, help='Report what would change without moving anything.')
+def migrate_command(dry_run):
+    """Move book files out of app/static/uploads/books into UPLOAD_FOLDER."""
+    moved, rewritten, missing = migrate(dry_run)
+    if not dry_run:
+        db.session.commit()
+    prefix = 'Would move' if dry_run else 'Moved'
+    click.echo(f'{prefix} {moved} files, {rewritten} paths rewritten, {missing} files not found.')
+
+
+def init_app(app):
+    app.cli.add_command(storage_cli)
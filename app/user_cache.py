@@ -0,0 +1,185 @@
+# app/user_cache.py
+"""Cached Flask-Login user loader.
+
+Every authenticated request used to run ``User.query.get`` and most pages
+then lazy-loaded ``current_user.wallet`` as well.  The loader now serves a
+detached snapshot of the user and their wallet from an in-process TTL/LRU
+cache, so a warm request issues no queries for ``current_user``.
+
+Entries are dropped explicitly whenever the underlying rows change (role or
+active flag edits, wallet movements, logout) and again once the change
+commits.  Other worker processes only see the change when their entry
+expires, so the TTL bounds how stale a snapshot can be.  The cached balance
+is for display only: debits are decided by the guarded UPDATE in app.ledger,
+never by this value.
+"""
+import threading
+import time
+from collections import OrderedDict
+import sqlalchemy as sa
+from flask import current_app
+from flask_login import UserMixin
+from app import db, db_routing, login_manager, metrics
+from app.models import User, Wallet
+
+DEFAULT_TTL = 60  # seconds
+DEFAULT_SIZE = 1024  # users
+_STALE_KEY = 'user_cache.stale'
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # user_id -> (expires_at, snapshot dict)
+_counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+
+class CachedWallet:
+    """Read-only wallet snapshot: the navbar balance and the wallet page's totals."""
+
+    def __init__(self, wallet_id, user_id, balance_cents, earned_cents, spent_cents, updated_at):
+        self.wallet_id = wallet_id
+        self.user_id = user_id
+        self.balance_cents = balance_cents
+        self.earned_cents = earned_cents
+        self.spent_cents = spent_cents
+        self.updated_at = updated_at
+
+    @property
+    def balance(self):
+        return (self.balance_cents or 0) / 100
+
+    @property
+    def earned(self):
+        return (self.earned_cents or 0) / 100
+
+    @property
+    def spent(self):
+        return (self.spent_cents or 0) / 100
+
+
+class CachedUser(UserMixin):
+    """Detached stand-in for ``User`` used as ``current_user``.
+
+    Holds the scalar columns templates read on every page.  Anything else
+    (``books``, ``transactions``...) transparently loads the real row.
+    """
+
+    def __init__(self, data):
+        wallet = data.pop('wallet')
+        self._active = data.pop('is_active')
+        self.__dict__.update(data)
+        self.wallet = CachedWallet(**wallet) if wallet else None
+
+    @property
+    def is_active(self):
+        return self._active is not False
+
+    def get_id(self):
+        return str(self.user_id)
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def _model(self):
+        return db.session.get(User, self.user_id)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._model(), name)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def _fetch(user_id):
+    # Entries outlive the request, so never fill them from a lagging replica
+    with db_routing.primary():
+        row = db.session.execute(
+            sa.select(User.user_id, User.username, User.email, User.role, User.student_id,
+                      User.is_active, User.created_at,
+                      Wallet.wallet_id, Wallet.balance_cents, Wallet.earned_cents, Wallet.spent_cents,
+                      Wallet.updated_at.label('wallet_updated_at'))
+              .outerjoin(Wallet, Wallet.user_id == User.user_id)
+              .where(User.user_id == user_id)
+        ).first()
+    if row is None:
+        return None
+    data = dict(row._mapping)
+    wallet = {'wallet_id': data.pop('wallet_id'), 'user_id': user_id,
+              'balance_cents': data.pop('balance_cents'), 'earned_cents': data.pop('earned_cents'),
+              'spent_cents': data.pop('spent_cents'), 'updated_at': data.pop('wallet_updated_at')}
+    data['wallet'] = wallet if wallet['wallet_id'] is not None else None
+    return data
+
+
+def get(user_id):
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry and entry[0] > now:
+            _entries.move_to_end(user_id)
+            _counters['hits'] += 1
+            metrics.cache_lookup('user', True)
+            return CachedUser(dict(entry[1]))
+        _counters['misses'] += 1
+    metrics.cache_lookup('user', False)
+
+    data = _fetch(user_id)
+    if data is None:
+        return None
+    ttl = current_app.config.get('USER_CACHE_TTL', DEFAULT_TTL)
+    size = current_app.config.get('USER_CACHE_SIZE', DEFAULT_SIZE)
+    with _lock:
+        _entries[user_id] = (now + ttl, data)
+        _entries.move_to_end(user_id)
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+            _counters['evictions'] += 1
+    return CachedUser(dict(data))
+
+
+def invalidate(*user_ids):
+    """Drop cached snapshots now, and again when the current transaction commits.
+
+    The second pass covers a concurrent request re-caching the old row between
+    this call and the commit.
+    """
+    with _lock:
+        for user_id in user_ids:
+            if _entries.pop(user_id, None) is not None:
+                _counters['invalidations'] += 1
+    db.session.info.setdefault(_STALE_KEY, set()).update(user_ids)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    """Hit/miss counters for monitoring."""
+    with _lock:
+        counters = dict(_counters, size=len(_entries))
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_rate'] = round(counters['hits'] / lookups * 100, 1) if lookups else 0.0
+    return counters
+
+
+def _after_commit(session):
+    stale = session.info.pop(_STALE_KEY, None)
+    if stale:
+        with _lock:
+            for user_id in stale:
+                _entries.pop(user_id, None)
+
+
+def _after_rollback(session):
+    session.info.pop(_STALE_KEY, None)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    return get(int(user_id))
+
+
+sa.event.listen(db.session, 'after_commit', _after_commit)
+sa.event.listen(db.session, 'after_rollback', _after_rollback)
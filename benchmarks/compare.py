@@ -0,0 +1,52 @@
+# benchmarks/compare.py
+"""Compare two benchmarks/load.py results, e.g. the parent commit against HEAD.
+
+Prints p50/p95/p99 and throughput per scenario with the relative change, and
+exits non-zero when any scenario's p95 got slower by more than --threshold
+percent (and by at least 1 ms, so sub-millisecond noise doesn't count).
+
+Usage: python benchmarks/compare.py base.json head.json [--threshold 20]
+"""
+import argparse
+import json
+import sys
+
+
+def _change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=20.0, help='allowed p95 slowdown in percent')
+    args = parser.parse_args()
+    with open(args.base) as handle:
+        base = json.load(handle)
+    with open(args.head) as handle:
+        head = json.load(handle)
+
+    print(f"base {base['meta'].get('commit')}  head {head['meta'].get('commit')}")
+    print(f"{'scenario':<20} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'req/s':>15}")
+    regressed = []
+    for name, new in head['scenarios'].items():
+        old = base['scenarios'].get(name)
+        if old is None:
+            print(f'{name:<20} (not in base)')
+            continue
+        cells = [f"{new[key]:>8.2f} {_change(old[key], new[key]):>+7.1f}%"
+                 for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+        cells.append(f"{new['throughput_rps']:>6.1f} {_change(old['throughput_rps'], new['throughput_rps']):>+7.1f}%")
+        print(f'{name:<20} ' + ' '.join(cells))
+        if (_change(old['p95_ms'], new['p95_ms']) > args.threshold
+                and new['p95_ms'] - old['p95_ms'] >= 1.0):
+            regressed.append(name)
+    if regressed:
+        print(f"p95 regressed by more than {args.threshold:g}%: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+# benchmarks/datagen.py
+"""Build a realistic synthetic dataset for benchmarks and load tests.
+
+* users with wallets, one admin (``admin``) and students ``user1``..``userN``,
+  all with the password PASSWORD
+* books in the BookForm categories, uploaded by a minority of the students
+  (a few power sellers list most of them), titles/descriptions drawn from a
+  long-tailed vocabulary so searches have realistic selectivity
+* purchases and rentals with Zipf-skewed book popularity and buyer activity:
+  a book is rented any number of times until it is sold, rentals on one book
+  never overlap, a sale hands the book to the buyer, and the last rental of
+  a book may still be running (status ``rented``); attempts on a book that
+  is already sold or rented out are dropped, so about a third of
+  ``--transactions`` end up in the table
+* a deposit per user large enough to pay for their history, and ledger entries
+  for every payment, so wallet balances agree with ``ledger.balance_check()``
+  (and earned/spent totals with ``ledger.totals_check()``)
+
+Rows go in with bulk INSERTs into an empty database; counters are reconciled,
+revenue rollups backfilled and the search index is filled by its triggers.  The same ``--seed`` always
+produces the same data.  Usage:
+
+    python benchmarks/datagen.py --db /tmp/bench.db [--users 1000] [--books 20000]
+                                 [--transactions 50000] [--seed 1]
+
+Then serve it with ``DATABASE_URL=sqlite:////tmp/bench.db gunicorn run:app``
+and drive it with ``benchmarks/load.py --url``.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import sqlalchemy as sa  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+from config import config, TestingConfig  # noqa: E402
+from app import analytics, create_app, db, stats  # noqa: E402
+from app.books.forms import BookForm  # noqa: E402
+from app.models import User, Wallet, Book, Transaction, Rental, LedgerEntry  # noqa: E402
+
+PASSWORD = 'benchmark'
+CATEGORIES = [value for value, _ in BookForm.category.kwargs['choices'] if value]
+CATEGORY_WEIGHTS = [40, 15, 12, 15, 8, 10]  # textbooks dominate a campus library
+SUBJECTS = ('algebra calculus finance accounting biology chemistry history economics statistics physics '
+            'law ethics programming networks databases marketing management literature philosophy '
+            'psychology sociology anatomy nursing').split()
+PURCHASE_SHARE = 0.3  # of transactions; the rest are rentals
+DAYS = 365  # history length
+
+
+def make_app(path, name='datagen', **settings):
+    defaults = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path, 'JOBS_MODE': 'worker', 'PERF_SLOW_QUERY_MS': None}
+    config[name] = type(f'{name.title()}Config', (TestingConfig,), dict(defaults, **settings))
+    return create_app(name)
+
+
+def zipf_weights(n, s=1.1):
+    """Weight of rank i is 1/i^s: a handful of items get most of the traffic."""
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def _price(rng):
+    return round(max(2.0, rng.lognormvariate(2.8, 0.6)), 0) - 0.01
+
+
+def _book_rows(rng, count, sellers, start, now):
+    """``sellers`` maps user_id to signup time; a book is listed after its seller signs up."""
+    seller_ids = list(sellers)
+    vocabulary = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 10))) for _ in range(20000)]
+    seller_weights = zipf_weights(len(seller_ids))
+    step = (now - start) / count
+    rows = []
+    for i in range(count):
+        seller = rng.choices(seller_ids, cum_weights=seller_weights)[0]
+        created = start + step * i + timedelta(seconds=rng.random() * step.total_seconds())
+        created = max(created, sellers[seller] + timedelta(hours=1))
+        price = _price(rng)
+        rows.append({
+            'book_id': i + 1,
+            'title': ' '.join([rng.choice(SUBJECTS)] + rng.sample(vocabulary, 2)).title(),
+            'author': f'Author {rng.randrange(count // 10 + 1)}',
+            'isbn': str(9780000000000 + i),
+            'description': ' '.join(rng.choices(vocabulary, k=rng.randint(20, 60))),
+            'category': rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+            'price': price,
+            'rental_fee': round(max(0.5, price / 20), 2),
+            'status': 'available',
+            'uploaded_by': seller,
+            'created_at': created,
+            'updated_at': created,
+        })
+    return rows
+
+
+def _history(rng, books, buyers, count, now):
+    """(transactions, rentals) for ``count`` attempts; updates ``books`` in place.
+
+    ``buyers`` maps user_id to signup time, most active first.
+    """
+    buyer_ids = list(buyers)
+    book_weights = zipf_weights(len(books), s=0.9)
+    order = list(range(len(books)))
+    rng.shuffle(order)  # popularity is unrelated to age
+    buyer_weights = zipf_weights(len(buyer_ids), s=0.8)
+
+    events = {}
+    for _ in range(count):
+        book = books[order[rng.choices(range(len(books)), cum_weights=book_weights)[0]]]
+        span = (now - book['created_at']).total_seconds()
+        when = book['created_at'] + timedelta(seconds=rng.random() * span)
+        kind = 'purchase' if rng.random() < PURCHASE_SHARE else 'rental'
+        events.setdefault(book['book_id'], []).append((when, kind))
+
+    transactions, rentals = [], []
+    by_id = {book['book_id']: book for book in books}
+    for book_id, history in events.items():
+        book = by_id[book_id]
+        free_from = book['created_at']
+        for when, kind in sorted(history):
+            if when < free_from:
+                continue  # still rented out
+            buyer = rng.choices(buyer_ids, cum_weights=buyer_weights)[0]
+            if buyer == book['uploaded_by'] or buyers[buyer] > when:
+                continue
+            transaction = {'transaction_id': len(transactions) + 1, 'user_id': buyer, 'book_id': book_id,
+                           'transaction_type': kind, 'status': 'completed', 'created_at': when,
+                           'payee': book['uploaded_by']}
+            if kind == 'purchase':
+                transaction['amount'] = book['price']
+                transactions.append(transaction)
+                book.update(status='sold', uploaded_by=buyer, updated_at=when)
+                break
+            days = rng.choice((1, 3, 7, 7, 14))
+            end = when + timedelta(days=days)
+            transaction['amount'] = round(book['rental_fee'] * days, 2)
+            transactions.append(transaction)
+            rentals.append({'transaction_id': transaction['transaction_id'], 'start_date': when,
+                            'end_date': end, 'is_active': end > now})
+            if end > now:
+                book.update(status='rented', updated_at=when)
+                break
+            free_from = end
+    return transactions, rentals
+
+
+def _ledger(rng, users, transactions):
+    """(wallets, ledger entries): a covering deposit per user, then both sides of every payment."""
+    spend = dict.fromkeys(users, 0)
+    for transaction in transactions:
+        spend[transaction['user_id']] += round(transaction['amount'] * 100)
+    balances, earned, entries = {}, dict.fromkeys(users, 0), []
+    for user_id, created in users.items():
+        deposit = spend[user_id] + rng.randrange(5000, 50000)
+        balances[user_id] = deposit
+        entries.append({'wallet_id': user_id, 'transaction_id': None, 'amount_cents': deposit,
+                        'entry_type': 'deposit', 'created_at': created})
+    for transaction in transactions:
+        cents = round(transaction['amount'] * 100)
+        purchase = transaction['transaction_type'] == 'purchase'
+        balances[transaction['user_id']] -= cents
+        balances[transaction['payee']] += cents
+        earned[transaction['payee']] += cents
+        entries.append({'wallet_id': transaction['user_id'], 'transaction_id': transaction['transaction_id'],
+                        'amount_cents': -cents, 'entry_type': 'purchase' if purchase else 'rental',
+                        'created_at': transaction['created_at']})
+        entries.append({'wallet_id': transaction['payee'], 'transaction_id': transaction['transaction_id'],
+                        'amount_cents': cents, 'entry_type': 'sale' if purchase else 'rental_income',
+                        'created_at': transaction['created_at']})
+    wallets = [{'wallet_id': user_id, 'user_id': user_id, 'balance_cents': balance,
+                'earned_cents': earned[user_id], 'spent_cents': spend[user_id],
+                'created_at': users[user_id], 'updated_at': users[user_id]}
+               for user_id, balance in balances.items()]
+    return wallets, entries
+
+
+def _insert(model, rows, batch=5000):
+    for offset in range(0, len(rows), batch):
+        db.session.execute(sa.insert(model), rows[offset:offset + batch])
+
+
+def seed(users=1000, books=20000, transactions=50000, seed=1, now=None):
+    """Fill the (empty) current database; returns the row counts."""
+    if db.session.query(User.user_id).first() is not None:
+        raise RuntimeError('datagen needs an empty database')
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    start = now - timedelta(days=DAYS)
+    password_hash = generate_password_hash(PASSWORD)  # one hash for everyone: hashing is slow on purpose
+
+    user_rows = [{'user_id': 1, 'username': 'admin', 'email': 'admin@example.com', 'role': 'admin',
+                  'password_hash': password_hash, 'is_active': True, 'created_at': start}]
+    for i in range(1, users + 1):
+        created = start + timedelta(days=DAYS * 0.8 * rng.random())
+        user_rows.append({'user_id': i + 1, 'username': f'user{i}', 'email': f'user{i}@example.com',
+                          'role': 'student', 'student_id': f'S{i:07d}', 'password_hash': password_hash,
+                          'is_active': rng.random() > 0.02, 'created_at': created})
+    signups = {row['user_id']: row['created_at'] for row in user_rows[1:]}
+    seller_ids = rng.sample(sorted(signups), max(1, len(signups) // 5))
+    buyer_ids = sorted(signups)
+    rng.shuffle(buyer_ids)
+
+    book_rows = _book_rows(rng, books, {user_id: signups[user_id] for user_id in seller_ids}, start, now)
+    transaction_rows, rental_rows = _history(rng, book_rows, {user_id: signups[user_id] for user_id in buyer_ids},
+                                             transactions, now)
+    wallet_rows, entry_rows = _ledger(rng, signups, transaction_rows)
+
+    _insert(User, user_rows)
+    _insert(Book, book_rows)
+    _insert(Transaction, [{key: value for key, value in row.items() if key != 'payee'}
+                          for row in transaction_rows])
+    _insert(Rental, rental_rows)
+    _insert(Wallet, wallet_rows)
+    _insert(LedgerEntry, entry_rows)
+    stats.reconcile()
+    analytics.backfill()
+    db.session.commit()
+    return {'users': len(user_rows), 'books': len(book_rows), 'transactions': len(transaction_rows),
+            'rentals': len(rental_rows), 'ledger_entries': len(entry_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='SQLite file to create (must not exist)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--transactions', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if os.path.exists(args.db):
+        parser.error(f'{args.db} already exists')
+
+    app = make_app(os.path.abspath(args.db))
+    start = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        counts = seed(args.users, args.books, args.transactions, args.seed)
+    print(', '.join(f'{value} {name}' for name, value in counts.items()) +
+          f' in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# benchmarks/load.py
+"""Latency and throughput of the key pages, as JSON that can be compared between commits.
+
+Scenarios (``--scenarios`` picks a subset):
+
+    catalog, search, book_detail           anonymous visitor
+    dashboard, purchase_book, rent_book    signed-in student with a funded wallet
+    admin_dashboard, admin_users, admin_books, admin_transactions
+
+Book ids follow a Zipf distribution, so a few books get most detail views;
+every purchase and rental takes a different available book.  Each scenario
+gets ``--warmup`` unrecorded requests, then ``--requests`` timed ones spread
+over ``--threads`` threads, each thread with its own signed-in client.
+
+In-process (default) the requests go through the Flask test client against a
+copy of ``--db`` (made with benchmarks/datagen.py), or a dataset generated
+for the run from ``--seed``.  With ``--url`` they go over HTTP to a running
+server, e.g. gunicorn on a datagen database; ``--db`` must then be that same
+file, which is read for ids and used to fund the benchmark students:
+
+    python benchmarks/datagen.py --db /tmp/bench.db
+    DATABASE_URL=sqlite:////tmp/bench.db gunicorn -w 4 run:app &
+    python benchmarks/load.py --url http://127.0.0.1:8000 --db /tmp/bench.db --threads 8
+
+Purchases and rentals change the database, so give each HTTP run a fresh
+copy.  Results (p50/p95/p99/mean/max in ms, requests per second) go to
+stdout or ``--out``; benchmarks/compare.py diffs two of them.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import datagen  # noqa: E402
+from app import db, ledger  # noqa: E402
+from app.models import User, Book  # noqa: E402
+from app.perf import percentile  # noqa: E402
+
+_CSRF = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+class Workload:
+    """Ids and terms the scenarios draw from; ``take_book`` hands out each available book once."""
+
+    def __init__(self, students, all_books, available, terms, rng):
+        self.students = students
+        self.all_books = all_books
+        self.weights = datagen.zipf_weights(len(all_books), s=0.9)
+        self.terms = terms
+        self._available = deque(available)
+        self._lock = threading.Lock()
+        rng.shuffle(self._available)
+
+    def hot_book(self, rng):
+        return rng.choices(self.all_books, cum_weights=self.weights)[0]
+
+    def take_book(self):
+        with self._lock:
+            return self._available.popleft()
+
+
+def _catalog(rng, work):
+    category = rng.choice(datagen.CATEGORIES) if rng.random() < 0.5 else None
+    return 'GET', '/books/catalog' + (f'?category={category}' if category else ''), None
+
+
+SCENARIOS = {
+    # name: (role, request builder, expected statuses)
+    'catalog': ('anonymous', _catalog, {200}),
+    'search': ('anonymous', lambda rng, work: (
+        'GET', '/books/catalog?' + urllib.parse.urlencode({'search': rng.choice(work.terms)}), None), {200}),
+    'book_detail': ('anonymous', lambda rng, work: ('GET', f'/books/book/{work.hot_book(rng)}', None), {200}),
+    'dashboard': ('student', lambda rng, work: ('GET', '/dashboard', None), {200}),
+    'purchase_book': ('student', lambda rng, work: ('GET', f'/payments/purchase/{work.take_book()}', None), {302}),
+    'rent_book': ('student', lambda rng, work: (
+        'POST', f'/payments/rent/{work.take_book()}', {'rental_days': rng.choice((1, 3, 7, 14))}), {302}),
+    'admin_dashboard': ('admin', lambda rng, work: ('GET', '/admin/dashboard', None), {200}),
+    'admin_users': ('admin', lambda rng, work: ('GET', '/admin/users', None), {200}),
+    'admin_books': ('admin', lambda rng, work: ('GET', '/admin/books', None), {200}),
+    'admin_transactions': ('admin', lambda rng, work: ('GET', '/admin/transactions', None), {200}),
+}
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code
+
+    def login(self, username):
+        return self.request('POST', '/auth/login', {'login_identifier': username, 'password': datagen.PASSWORD})
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """A browser-ish client: keeps cookies, doesn't follow redirects, sends CSRF tokens."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _open(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    def request(self, method, path, data=None):
+        if data is not None:
+            # Fetching the form for its token isn't part of the timed request
+            data = dict(data, csrf_token=self.csrf_token(path))
+            start = time.perf_counter()
+            status = self._open(method, path, data)[0]
+        else:
+            start = time.perf_counter()
+            status = self._open(method, path)[0]
+        self.elapsed = time.perf_counter() - start
+        return status
+
+    def csrf_token(self, path):
+        match = _CSRF.search(self._open('GET', path)[1].decode('utf-8', 'replace'))
+        return match.group(1) if match else ''
+
+    def login(self, username):
+        return self.request('POST', '/auth/login', {'login_identifier': username, 'password': datagen.PASSWORD})
+
+
+def _timed(client, method, path, data):
+    start = time.perf_counter()
+    status = client.request(method, path, data)
+    # The HTTP client times just the request, without its CSRF token fetch
+    return status, getattr(client, 'elapsed', time.perf_counter() - start)
+
+
+def run_scenario(name, make_client, work, args):
+    role, build, expected = SCENARIOS[name]
+    clients = []
+    for index in range(args.threads):
+        client = make_client()
+        if role == 'student':
+            client.login(work.students[index % len(work.students)])
+        elif role == 'admin':
+            client.login('admin')
+        clients.append(client)
+
+    rng = random.Random(args.seed)
+    for index in range(args.warmup):
+        client = clients[index % len(clients)]
+        client.request(*build(rng, work))
+
+    samples, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def worker(client, count, seed):
+        thread_rng = random.Random(seed)
+        mine, codes = [], Counter()
+        for _ in range(count):
+            try:
+                status, elapsed = _timed(client, *build(thread_rng, work))
+            except Exception as error:  # connection reset, timeout...
+                status, elapsed = type(error).__name__, 0.0
+            codes[status] += 1
+            if status in expected:
+                mine.append(elapsed * 1000)
+        with lock:
+            samples.extend(mine)
+            statuses.update(codes)
+
+    shares = [args.requests // args.threads + (1 if i < args.requests % args.threads else 0)
+              for i in range(args.threads)]
+    threads = [threading.Thread(target=worker, args=(client, share, args.seed * 1000 + i))
+               for i, (client, share) in enumerate(zip(clients, shares))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        'requests': args.requests,
+        'errors': args.requests - len(samples),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'p50_ms': round(percentile(samples, 0.50), 2),
+        'p95_ms': round(percentile(samples, 0.95), 2),
+        'p99_ms': round(percentile(samples, 0.99), 2),
+        'mean_ms': round(sum(samples) / len(samples), 2) if samples else 0.0,
+        'max_ms': round(samples[-1], 2) if samples else 0.0,
+        'throughput_rps': round(args.requests / wall, 1) if wall else 0.0,
+    }
+
+
+def _workload(students_needed, rng):
+    """Pick funded, active, non-selling students and the ids/terms to request."""
+    sellers = db.session.query(Book.uploaded_by).distinct()
+    students = [name for name, in db.session.query(User.username)
+                .filter(User.role == 'student', User.is_active.is_(True), User.user_id.not_in(sellers))
+                .order_by(User.user_id).limit(students_needed)]
+    for user_id, in db.session.query(User.user_id).filter(User.username.in_(students)):
+        ledger.credit(user_id, 10_000_000, 'deposit')  # enough for every purchase in the run
+    db.session.commit()
+    all_books = [book_id for book_id, in db.session.query(Book.book_id).order_by(Book.book_id)]
+    available = [book_id for book_id, in db.session.query(Book.book_id).filter(Book.status == 'available')
+                 .order_by(Book.book_id)]
+    titles = [title for title, in db.session.query(Book.title).order_by(Book.book_id).limit(2000)]
+    terms = [title.split()[0].lower() for title in titles[:200]] + \
+            [' '.join(title.split()[:2]).lower() for title in titles[200:400]] + ['zz-no-match']
+    return Workload(students, all_books, available, terms, rng)
+
+
+def _git_commit():
+    root = os.path.join(os.path.dirname(__file__), os.pardir)
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='drive a running server instead of the in-process test client')
+    parser.add_argument('--db', help='datagen database (copied for in-process runs)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--users', type=int, default=500, help='dataset size when generating one')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--transactions', type=int, default=20000)
+    parser.add_argument('--out', help='write the JSON here instead of stdout')
+    args = parser.parse_args()
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - SCENARIOS.keys()
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+    if args.url and not args.db:
+        parser.error('--url needs --db, the database the server is using')
+
+    workdir = tempfile.mkdtemp(prefix='library-load-')
+    try:
+        if args.url:
+            path = os.path.abspath(args.db)
+        else:
+            path = os.path.join(workdir, 'bench.db')
+            if args.db:
+                shutil.copyfile(args.db, path)
+        app = datagen.make_app(path, name='load', SESSION_STORE_PATH=os.path.join(workdir, 'sessions'))
+        with app.app_context():
+            if not args.url and not args.db:
+                db.create_all()
+                dataset = datagen.seed(args.users, args.books, args.transactions, args.seed)
+            else:
+                dataset = {'db': os.path.abspath(args.db)}
+            work = _workload(args.threads, random.Random(args.seed))
+            db.session.remove()
+        if args.url:
+            make_client = lambda: HttpClient(args.url)  # noqa: E731
+        else:
+            make_client = lambda: TestClient(app)  # noqa: E731
+
+        commit, dirty = _git_commit()
+        result = {
+            'meta': {
+                'commit': commit, 'dirty': dirty, 'started_at': datetime.utcnow().isoformat() + 'Z',
+                'mode': 'http' if args.url else 'in-process', 'url': args.url,
+                'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                'cpus': os.cpu_count(), 'threads': args.threads, 'requests': args.requests,
+                'warmup': args.warmup, 'seed': args.seed, 'dataset': dataset,
+            },
+            'scenarios': {},
+        }
+        for name in names:
+            result['scenarios'][name] = run_scenario(name, make_client, work, args)
+            print(f"{name:<20} p50 {result['scenarios'][name]['p50_ms']:>8.2f} ms  "
+                  f"p95 {result['scenarios'][name]['p95_ms']:>8.2f} ms  "
+                  f"{result['scenarios'][name]['throughput_rps']:>7.1f} req/s", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+    failed = any(scenario['errors'] for scenario in result['scenarios'].values())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+# benchmarks/query_plans.py
+"""Fail if a hot page's queries fall back to a full table scan.
+
+Requests the busiest pages through the test client on a small seeded
+database, captures every statement they run, and checks its
+``EXPLAIN QUERY PLAN``.  A filtered statement that reads a hot table with a
+plain ``SCAN <table>`` (no index), or sorts a LIMITed listing in a temp
+B-tree, is reported with its SQL and the script exits non-zero.  Unfiltered
+whole-table aggregates (admin totals) have to read every row and are not
+flagged, nor is the sort of a top-N over GROUP BY results (analytics
+rankings), which no index can provide.
+
+``--query-counts`` instead renders each transaction listing at two page
+sizes and fails if the number of statements differs, i.e. if a template
+lazy-loads something per row that its loader profile (app/queries.py)
+should fetch with the page.
+
+Usage: python benchmarks/query_plans.py [--verbose] [--query-counts]
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import sqlalchemy as sa  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Wallet, Book, Transaction, Rental  # noqa: E402
+from app.pagination import encode_cursor  # noqa: E402
+
+HOT_TABLES = {'books', 'transactions', 'rentals', 'wallets', 'wallet_ledger',
+              'revenue_rollups', 'book_revenue_rollups'}
+
+
+def seed():
+    seller = User(username='seller', email='seller@example.com', role='student')
+    buyer = User(username='buyer', email='buyer@example.com', role='student')
+    reader = User(username='reader', email='reader@example.com', role='student')
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    for user in (seller, buyer, reader, admin):
+        user.set_password('pw')
+    db.session.add_all([seller, buyer, reader, admin])
+    db.session.flush()
+    db.session.add_all([Wallet(user_id=seller.user_id, balance_cents=0),
+                        Wallet(user_id=buyer.user_id, balance_cents=100000)])
+    now = datetime.utcnow()
+    books = [Book(title=f'Plan {i}', author='Index', description='-', category=('textbook', 'other')[i % 2],
+                  price=5, rental_fee=1, uploaded_by=seller.user_id, created_at=now - timedelta(minutes=i))
+             for i in range(60)]
+    db.session.add_all(books)
+    db.session.flush()
+    # Two renters, so admin listings show rows from different users
+    for i, book in enumerate(books[:20]):
+        transaction = Transaction(user_id=(buyer, reader)[i % 2].user_id, book_id=book.book_id, amount=1,
+                                  transaction_type='rental', created_at=now - timedelta(minutes=i))
+        db.session.add(transaction)
+        db.session.flush()
+        db.session.add(Rental(transaction_id=transaction.transaction_id, end_date=now + timedelta(days=3)))
+        book.status = 'rented'
+    db.session.commit()
+    return books[0].book_id, (books[20].created_at, books[20].book_id)
+
+
+def pages(first_book_id, later_key):
+    created_at, book_id = later_key
+    cursor = encode_cursor({'k': [created_at.isoformat(), book_id], 'd': 'next', 'p': 2})
+    anonymous = [
+        '/books/catalog',
+        '/books/catalog?category=textbook',
+        f'/books/catalog?cursor={cursor}',
+        f'/books/book/{first_book_id}',
+    ]
+    buyer = [
+        '/dashboard',
+        '/payments/wallet',
+        '/payments/transaction-history',
+        f'/books/book/{first_book_id}/file',
+    ]
+    seller = [
+        '/books/my-books',
+        f'/books/my-books?cursor={cursor}',
+        '/payments/wallet',
+    ]
+    admin = [
+        '/admin/dashboard',
+        '/admin/analytics',
+        '/admin/analytics/data?bucket=month',
+        '/payments/transaction-history',
+    ]
+    return [(None, anonymous), ('buyer', buyer), ('seller', seller), ('admin', admin)]
+
+
+# (user, url, config key of the page size) for the listings whose query count must not grow with it
+COUNTED = [
+    ('buyer', '/dashboard', 'DASHBOARD_RECENT_TRANSACTIONS'),
+    ('buyer', '/payments/transaction-history', 'TRANSACTION_HISTORY_PER_PAGE'),
+    ('admin', '/payments/transaction-history', 'TRANSACTION_HISTORY_PER_PAGE'),
+    ('admin', '/admin/transactions', 'ADMIN_TRANSACTIONS_PER_PAGE'),
+    ('admin', '/admin/dashboard', 'ADMIN_DASHBOARD_RECENT_TRANSACTIONS'),
+]
+PAGE_SIZES = (2, 8)  # both fully filled by the seeded rows
+
+
+def query_counts(app, engine, verbose=False):
+    """Statements per request for each COUNTED page at both PAGE_SIZES; returns the failures."""
+    count = [0]
+
+    def counter(conn, cursor, statement, parameters, context, executemany):
+        count[0] += 1
+
+    clients, failures = {}, []
+    for username, url, setting in COUNTED:
+        if username not in clients:
+            clients[username] = app.test_client()
+            clients[username].post('/auth/login', data={'login_identifier': username, 'password': 'pw'})
+        client = clients[username]
+        client.get(url)  # warm the user cache and counters so both runs start alike
+        counts = []
+        for size in PAGE_SIZES:
+            app.config[setting] = size
+            sa.event.listen(engine, 'before_cursor_execute', counter)
+            count[0] = 0
+            status = client.get(url).status_code
+            sa.event.remove(engine, 'before_cursor_execute', counter)
+            counts.append(count[0])
+            if status != 200:
+                failures.append(f'{username} {url}: HTTP {status}')
+        app.config.pop(setting)
+        ok = len(set(counts)) == 1
+        if not ok:
+            failures.append(f'{username} {url}')
+        if verbose or not ok:
+            sizes = ', '.join(f'{n} statements at {size} rows' for size, n in zip(PAGE_SIZES, counts))
+            print(('ok   ' if ok else 'FAIL ') + f'{username:<6} {url:<32} {sizes}')
+    return failures
+
+
+def problems(plan, statement):
+    found = []
+    filtered = ' WHERE ' in statement or ' JOIN ' in statement
+    for detail in plan:
+        match = re.match(r'SCAN (\w+)', detail)
+        if filtered and match and match.group(1) in HOT_TABLES and 'USING' not in detail:
+            found.append(detail)
+        if detail.startswith('USE TEMP B-TREE FOR ORDER BY') and ' LIMIT ' in statement \
+                and ' GROUP BY ' not in statement:
+            found.append(detail)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--verbose', action='store_true', help='print every plan, not just failures')
+    parser.add_argument('--query-counts', action='store_true',
+                        help='check statements per request stay constant across page sizes instead')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    app.config['PAGE_CACHE_BACKEND'] = None
+    with app.app_context():
+        db.create_all()
+        first_book_id, later_key = seed()
+        engine = db.engine
+
+    if args.query_counts:
+        failures = query_counts(app, engine, args.verbose)
+        print(f'{len(COUNTED)} pages checked, {len(failures)} with per-row queries')
+        for failure in failures:
+            print('  ' + failure)
+        return 1 if failures else 0
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            captured.append((statement, parameters))
+
+    sa.event.listen(engine, 'before_cursor_execute', capture)
+    for username, urls in pages(first_book_id, later_key):
+        client = app.test_client()
+        if username:
+            client.post('/auth/login', data={'login_identifier': username, 'password': 'pw'})
+        for url in urls:
+            client.get(url)
+    sa.event.remove(engine, 'before_cursor_execute', capture)
+
+    failures, seen = [], set()
+    with engine.connect() as connection:
+        for statement, parameters in captured:
+            if statement in seen or not any(table in statement for table in HOT_TABLES):
+                continue
+            seen.add(statement)
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+            plan = [row[-1] for row in rows]
+            bad = problems(plan, statement)
+            if bad or args.verbose:
+                print(('FAIL ' if bad else 'ok   ') + ' '.join(statement.split())[:160])
+                for detail in plan:
+                    print('       ' + detail)
+            if bad:
+                failures.append(statement)
+    print(f'{len(seen)} distinct statements checked, {len(failures)} with table scans')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# benchmarks/search_benchmark.py
+"""Compare catalog search via LIKE scans against the books_fts index.
+
+Usage: python benchmarks/search_benchmark.py [--books 50000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from app import create_app, db  # noqa: E402
+from app.models import Book, User  # noqa: E402
+from app.search import search_books  # noqa: E402
+
+WORDS = ('algebra calculus finance accounting biology chemistry history economics '
+         'statistics physics law ethics programming networks databases marketing '
+         'management literature philosophy psychology sociology anatomy nursing').split()
+CATEGORIES = ('textbook', 'fiction', 'non-fiction', 'academic', 'research', 'other')
+TERMS = ('calculus', 'financ', 'data', 'intro statistics', 'zz-no-match')
+
+
+def seed(count):
+    user = User(username='bench', email='bench@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    rng = random.Random(42)
+    # A long-tailed vocabulary so description terms are selective, like real abstracts.
+    vocabulary = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 10)))
+                  for _ in range(20000)]
+    rows = [{
+        'title': ' '.join([rng.choice(WORDS)] + rng.sample(vocabulary, 2)).title(),
+        'author': f'Author {rng.randrange(count // 10 + 1)}',
+        'isbn': str(9780000000000 + i),
+        'description': ' '.join(rng.choices(vocabulary, k=40)),
+        'category': rng.choice(CATEGORIES),
+        'price': 10.0,
+        'rental_fee': 1.0,
+        'status': 'available',
+        'uploaded_by': user.user_id,
+    } for i in range(count)]
+    db.session.execute(Book.__table__.insert(), rows)
+    db.session.commit()
+
+
+def like_query(term):
+    return Book.query.filter_by(status='available')\
+                     .filter(Book.title.contains(term) | Book.author.contains(term))
+
+
+def fts_query(term):
+    return search_books(Book.query.filter_by(status='available'), term)
+
+
+def timed(build, term, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(term).paginate(page=1, per_page=12, error_out=False)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed(args.books)
+        print(f'{args.books} books, median of {args.repeat} runs (paginate page 1)')
+        print(f'{"term":<20}{"LIKE ms":>10}{"FTS5 ms":>10}{"speedup":>10}')
+        for term in TERMS:
+            like_ms = timed(like_query, term, args.repeat)
+            fts_ms = timed(fts_query, term, args.repeat)
+            print(f'{term:<20}{like_ms:>10.2f}{fts_ms:>10.2f}{like_ms / fts_ms:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
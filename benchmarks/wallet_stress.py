@@ -0,0 +1,149 @@
+# benchmarks/wallet_stress.py
+"""Hammer purchase_book/rent_book from many threads and check money is conserved.
+
+Runs against a throwaway SQLite file so threads really contend for the write
+lock. Exits non-zero if any invariant is violated:
+
+* the sum of all wallet balances is unchanged (money only moves between wallets)
+* every wallet balance equals the sum of its ledger entries
+* every wallet's earned/spent totals agree with its ledger entries
+* no wallet is negative
+* no book is sold or rented more than once
+
+Usage: python benchmarks/wallet_stress.py [--threads 16] [--users 8] [--books 300] [--ops 60]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from config import config, TestingConfig  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Wallet, Book, Transaction, LedgerEntry  # noqa: E402
+from app import ledger  # noqa: E402
+
+
+def make_app(path):
+    config['stress'] = type('StressConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path,
+        'SQLITE_CONNECT_ARGS': {'timeout': 30},
+    })
+    return create_app('stress')
+
+
+def seed(users, books):
+    sellers = []
+    for i in range(4):
+        seller = User(username=f'seller{i}', email=f'seller{i}@example.com', role='student')
+        seller.set_password('pw')
+        sellers.append(seller)
+    buyers = []
+    for i in range(users):
+        buyer = User(username=f'buyer{i}', email=f'buyer{i}@example.com', role='student')
+        buyer.set_password('pw')
+        buyers.append(buyer)
+    db.session.add_all(sellers + buyers)
+    db.session.flush()
+    for user in sellers + buyers:
+        db.session.add(Wallet(user_id=user.user_id, balance=0))
+    db.session.flush()
+    for user in buyers:
+        ledger.credit(user.user_id, 5000, 'opening')
+    rng = random.Random(7)
+    for i in range(books):
+        db.session.add(Book(title=f'Stress {i}', author='Load', description='-', category='other',
+                            price=rng.choice([1.25, 3.10, 7.99]), rental_fee=rng.choice([0.35, 0.5, 1.1]),
+                            uploaded_by=sellers[i % len(sellers)].user_id))
+    db.session.commit()
+    return [u.username for u in buyers]
+
+
+def worker(app, username, book_ids, ops, seed_value, results):
+    rng = random.Random(seed_value)
+    client = app.test_client()
+    client.post('/auth/login', data={'login_identifier': username, 'password': 'pw'})
+    counts = {'ok': 0, 'rejected': 0, 'errors': 0}
+    for _ in range(ops):
+        book_id = rng.choice(book_ids)
+        if rng.random() < 0.5:
+            response = client.get(f'/payments/purchase/{book_id}')
+        else:
+            response = client.post(f'/payments/rent/{book_id}', data={'rental_days': rng.choice([1, 3, 7])})
+        if response.status_code >= 500:
+            counts['errors'] += 1
+        elif response.location and 'transaction-history' in response.location:
+            counts['ok'] += 1
+        else:
+            counts['rejected'] += 1
+    results.append(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--users', type=int, default=8, help='buyers; threads share them to contend on wallets')
+    parser.add_argument('--books', type=int, default=300)
+    parser.add_argument('--ops', type=int, default=60, help='requests per thread')
+    args = parser.parse_args()
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    app = make_app(path)
+    try:
+        with app.app_context():
+            db.create_all()
+            usernames = seed(args.users, args.books)
+            book_ids = [b for (b,) in db.session.query(Book.book_id)]
+            total_before = db.session.query(db.func.sum(Wallet.balance_cents)).scalar()
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(app, usernames[i % len(usernames)], book_ids,
+                                                         args.ops, i, results))
+                   for i in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            total_after = db.session.query(db.func.sum(Wallet.balance_cents)).scalar()
+            negative = Wallet.query.filter(Wallet.balance_cents < 0).count()
+            mismatched = ledger.balance_check()
+            totals_off = ledger.totals_check()
+            ledger_total = db.session.query(db.func.sum(LedgerEntry.amount_cents)).scalar()
+            double_sold = db.session.query(Transaction.book_id)\
+                .group_by(Transaction.book_id).having(db.func.count() > 1).count()
+
+        totals = {key: sum(r[key] for r in results) for key in ('ok', 'rejected', 'errors')}
+        requests = args.threads * args.ops
+        print(f'{requests} requests from {args.threads} threads in {elapsed:.2f}s '
+              f'({requests / elapsed:.0f} req/s): {totals}')
+        print(f'wallet total before={total_before} after={total_after} ledger={ledger_total}')
+        failures = []
+        if total_before != total_after or total_after != ledger_total:
+            failures.append('money not conserved')
+        if negative:
+            failures.append(f'{negative} negative wallets')
+        if mismatched:
+            failures.append(f'{len(mismatched)} wallets disagree with their ledger')
+        if totals_off:
+            failures.append(f'{len(totals_off)} wallets have earned/spent totals off their ledger')
+        if double_sold:
+            failures.append(f'{double_sold} books sold/rented more than once')
+        if totals['errors']:
+            failures.append(f"{totals['errors']} server errors")
+        print('FAIL: ' + '; '.join(failures) if failures else 'OK: all invariants hold')
+        return 1 if failures else 0
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 #config.py
 import os
+import tempfile
 from datetime import timedelta
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -9,13 +10,78 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'library.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica (see app/db_routing.py): a second server or a local SQLite copy
+    DB_REPLICA_URL = os.environ.get('DB_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': DB_REPLICA_URL} if DB_REPLICA_URL else {}
+    DB_REPLICA_ROUTES = os.environ.get('DB_REPLICA_ROUTES', 'get')  # 'get' or 'marked' (@use_replica only)
+    DB_REPLICA_LAG = 5  # seconds a session keeps reading the primary after it writes
+    DB_REPLICA_SYNC_INTERVAL = int(os.environ.get('DB_REPLICA_SYNC_INTERVAL', 0))  # 'flask replica sync' as a job
     
-    # File upload settings
-    UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'uploads', 'books')
+    # File upload settings. Book files live outside app/static so they are only served by
+    # books.download, which checks who may read them ('flask storage migrate' moves older uploads)
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(basedir, 'instance', 'books')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # Let the front proxy stream book files: None, 'x-sendfile' (Apache/lighttpd)
+    # or 'x-accel' (nginx; map BOOK_FILE_ACCEL_PREFIX to UPLOAD_FOLDER as an internal location)
+    BOOK_FILE_SENDFILE = os.environ.get('BOOK_FILE_SENDFILE')
+    BOOK_FILE_ACCEL_PREFIX = os.environ.get('BOOK_FILE_ACCEL_PREFIX', '/protected/books/')
+    
+    # Background jobs (see app/jobs.py): 'thread', 'worker' or 'sync'
+    JOBS_MODE = os.environ.get('JOBS_MODE', 'thread')
+    JOBS_THREADS = int(os.environ.get('JOBS_THREADS', 2))
+    JOBS_POLL = 5.0  # seconds between polls when idle
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_BACKOFF = 5  # seconds before the first retry, doubling after that
+    JOBS_LEASE = 300  # seconds before a job stuck in 'running' is retried elsewhere
+    
+    # Rows per page of the transaction listings
+    ADMIN_TRANSACTIONS_PER_PAGE = 20
+    TRANSACTION_HISTORY_PER_PAGE = 25
+    DASHBOARD_RECENT_TRANSACTIONS = 10
+    ADMIN_DASHBOARD_RECENT_TRANSACTIONS = 5
+    
+    # Rental expiry sweep (see app/rentals.py), run as a periodic job
+    RENTAL_SWEEP_INTERVAL = 300  # seconds; 0 disables the periodic job
+    RENTAL_SWEEP_BATCH = 1000
+    
+    # Dashboard counters (see app/stats.py) are rebuilt from the tables this often
+    # to correct drift from raw SQL and bulk deletes; 0 disables the periodic job
+    STATS_RECONCILE_INTERVAL = 86400
+    
+    # Rendered catalog/book pages (see app/page_cache.py): 'memory', 'sqlite' or '' to disable.
+    # 'sqlite' shares one cache (and its invalidations) between all workers on the host.
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH')  # default: instance/page_cache.db
+    PAGE_CACHE_SIZE = 512  # entries, least recently used evicted first
+    PAGE_CACHE_TTL = 300  # seconds; bounds staleness for per-process memory caches
+    PAGE_CACHE_ROLES = ('anonymous',)  # signed-in pages show the user's name and balance
+    
+    # Folded into page ETags (see app/conditional.py) so a deploy with new templates
+    # doesn't keep answering 304 for pages whose data is unchanged
+    RELEASE = os.environ.get('RELEASE', '')
+    
+    # Request timing and slow-query log (see app/perf.py, /admin/perf)
+    PERF_ENABLED = True
+    PERF_BUFFER_SIZE = 5000  # most recent requests kept for the percentiles
+    PERF_SLOW_QUERY_MS = float(os.environ.get('PERF_SLOW_QUERY_MS', 100))  # log statements slower than this
+    # Debugging only: also log their bound parameters, which can hold password hashes and emails
+    PERF_LOG_QUERY_PARAMS = os.environ.get('PERF_LOG_QUERY_PARAMS') == '1'
+    
+    # Prometheus metrics at /metrics (see app/metrics.py); without a token only direct
+    # (unproxied) loopback requests may scrape, and only where METRICS_ALLOW_LOOPBACK is on
+    METRICS_ENABLED = True
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_ALLOW_LOOPBACK = True
     
     # Session settings
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
+    # Where session data lives (see app/sessions.py): 'sqlite', 'filesystem' or 'cookie'
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite')
+    SESSION_STORE_PATH = os.environ.get('SESSION_STORE_PATH')  # default: instance/sessions[.db]
+    SESSION_PURGE_INTERVAL = 3600  # seconds between sweeps of expired sessions
+    # Server-side sessions expire PERMANENT_SESSION_LIFETIME after last use; an unchanged
+    # session's expiry is pushed out at most this often (seconds)
+    SESSION_TOUCH_INTERVAL = 3600
     
     # Flask-Mail settings (for future password reset functionality)
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.googlemail.com')
@@ -32,11 +98,33 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
+    METRICS_ALLOW_LOOPBACK = False  # /metrics needs METRICS_TOKEN
+    # Applied to every new SQLite connection (see app/engine.py); benchmarks/sqlite_profile.py
+    # compares this against the stock settings
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # readers don't block on the writer (or it on them)
+        'synchronous': 'NORMAL',  # fsync at checkpoints, not every commit; safe with WAL
+        'busy_timeout': 5000,  # ms a writer waits for the lock before "database is locked"
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB (negative), i.e. 64 MiB per connection
+        'temp_store': 'MEMORY',
+    }
+    # Passed to sqlite3.connect() for SQLite engines only (see app/engine.py), so DATABASE_URL
+    # and DB_REPLICA_URL can still point at another database
+    SQLITE_CONNECT_ARGS = {'timeout': 5, 'check_same_thread': False}
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 10,
+        'pool_pre_ping': False,  # local file, nothing to go stale
+    }
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    JOBS_MODE = 'sync'
+    SESSION_BACKEND = 'filesystem'
+    SESSION_STORE_PATH = os.path.join(tempfile.gettempdir(), 'library_app_test_sessions')
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,31 @@
+# gunicorn.conf.py
+"""gunicorn settings picked up from the working directory.
+
+Threaded workers: the heartbeat keeps running while a thread streams a long
+response (e.g. the transaction export), where a sync worker would be killed
+after ``timeout`` seconds.
+
+Workers share their Prometheus metrics through PROMETHEUS_MULTIPROC_DIR (see
+app/metrics.py).  prometheus_client reads it when first imported, so it is
+set here, before gunicorn loads the app, and emptied on every start so
+values from a previous run are not added to this one.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'library_app_metrics'))
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from app import metrics
+    metrics.child_exit(server, worker)
@@ -0,0 +1,85 @@
+"""wallet opening totals
+
+Revision ID: 3f6a9d2c8e15
+Revises: 8c4e1a7f3d92
+Create Date: 2026-10-18 04:14:32.799633
+
+"""
+from collections import defaultdict
+from itertools import groupby
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a9d2c8e15'
+down_revision = '8c4e1a7f3d92'
+branch_labels = None
+depends_on = None
+
+
+def _opening_totals(connection):
+    """Per-user (earned, spent) cents from the transactions that have no ledger entries.
+
+    Spend goes to the transaction's user.  Income goes to whoever owned the book
+    at the time: a purchase handed the book to its buyer, so that is the buyer of
+    the previous purchase, else the seller on the first purchase's 'sale' entry,
+    else (never sold) the uploader.  Income before a first sale that itself
+    predates the ledger has no known owner and is left out.
+    """
+    rows = connection.execute(sa.text(
+        "SELECT t.book_id, t.user_id, t.transaction_type, t.amount, b.uploaded_by, "
+        "NOT EXISTS (SELECT 1 FROM wallet_ledger l WHERE l.transaction_id = t.transaction_id) AS unrecorded, "
+        "(SELECT w.user_id FROM wallet_ledger l JOIN wallets w ON w.wallet_id = l.wallet_id "
+        " WHERE l.transaction_id = t.transaction_id AND l.entry_type = 'sale') AS seller "
+        "FROM transactions t LEFT JOIN books b ON b.book_id = t.book_id "
+        "WHERE t.transaction_type IN ('purchase', 'rental') AND t.book_id IN ("
+        " SELECT book_id FROM transactions u WHERE NOT EXISTS "
+        " (SELECT 1 FROM wallet_ledger l WHERE l.transaction_id = u.transaction_id)) "
+        "ORDER BY t.book_id, t.created_at, t.transaction_id"
+    ))
+    earned, spent = defaultdict(int), defaultdict(int)
+    for _, history in groupby(rows, key=lambda row: row.book_id):
+        history = list(history)
+        purchases = [row for row in history if row.transaction_type == 'purchase']
+        owner = purchases[0].seller if purchases else history[0].uploaded_by
+        for row in history:
+            if row.unrecorded:
+                cents = int(round((row.amount or 0) * 100))
+                spent[row.user_id] += cents
+                if owner is not None:
+                    earned[owner] += cents
+            if row.transaction_type == 'purchase':
+                owner = row.user_id
+    return [{'user_id': user_id, 'earned': earned.get(user_id, 0), 'spent': spent.get(user_id, 0)}
+            for user_id in set(earned) | set(spent)]
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('wallets', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('opening_earned_cents', sa.BigInteger(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('opening_spent_cents', sa.BigInteger(), server_default='0', nullable=False))
+
+    # History from before the ledger, which the earned/spent seeding in 5b8d2f4a9c13 could not see
+    connection = op.get_bind()
+    totals = _opening_totals(connection)
+    if totals:
+        connection.execute(sa.text(
+            "UPDATE wallets SET opening_earned_cents = :earned, opening_spent_cents = :spent, "
+            "earned_cents = earned_cents + :earned, spent_cents = spent_cents + :spent "
+            "WHERE user_id = :user_id"
+        ), totals)
+
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.execute("UPDATE wallets SET earned_cents = earned_cents - opening_earned_cents, "
+               "spent_cents = spent_cents - opening_spent_cents")
+    with op.batch_alter_table('wallets', schema=None) as batch_op:
+        batch_op.drop_column('opening_spent_cents')
+        batch_op.drop_column('opening_earned_cents')
+
+    # ### end Alembic commands ###
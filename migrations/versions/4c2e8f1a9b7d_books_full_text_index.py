@@ -0,0 +1,65 @@
+"""books full text index
+
+Revision ID: 4c2e8f1a9b7d
+Revises: bdbcf87bd3f4
+Create Date: 2026-10-18 03:06:06.951157
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c2e8f1a9b7d'
+down_revision = 'bdbcf87bd3f4'
+branch_labels = None
+depends_on = None
+
+# The schema as of this revision; app/search.py holds the live copy
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, description, isbn, category,
+        content='books', content_rowid='book_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author, description, isbn, category)
+        VALUES (new.book_id, new.title, new.author, new.description, new.isbn, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description, isbn, category)
+        VALUES ('delete', old.book_id, old.title, old.author, old.description, old.isbn, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, description, isbn, category ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author, description, isbn, category)
+        VALUES ('delete', old.book_id, old.title, old.author, old.description, old.isbn, old.category);
+        INSERT INTO books_fts(rowid, title, author, description, isbn, category)
+        VALUES (new.book_id, new.title, new.author, new.description, new.isbn, new.category);
+    END""",
+    "INSERT INTO books_fts(books_fts) VALUES ('rebuild')",
+]
+
+FTS_DROP = [
+    'DROP TRIGGER IF EXISTS books_fts_au',
+    'DROP TRIGGER IF EXISTS books_fts_ad',
+    'DROP TRIGGER IF EXISTS books_fts_ai',
+    'DROP TABLE IF EXISTS books_fts',
+]
+
+
+def upgrade():
+    # No-op on backends without FTS5; search falls back to LIKE matching there.
+    connection = op.get_bind()
+    if connection.dialect.name != 'sqlite':
+        return
+    if 'ENABLE_FTS5' not in connection.exec_driver_sql('PRAGMA compile_options').scalars().all():
+        return
+    for statement in FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        for statement in FTS_DROP:
+            connection.exec_driver_sql(statement)